@@ -0,0 +1,87 @@
+from collections.abc import Iterator
+from typing import Optional
+
+import numpy as np
+
+from board import Board, count_neighbouring_mines
+from game import Game
+
+DEFAULT_BATCH_SIZE = 1024
+
+
+class BoardBatch:
+    """A stack of boards sharing one shape, as (boards, cols, rows) arrays"""
+
+    number_of_mines: int
+    rows: int
+    cols: int
+    mines: np.ndarray
+    counts: np.ndarray
+
+    def __init__(self, number_of_mines: int, mines: np.ndarray, counts: np.ndarray):
+        self.number_of_mines = number_of_mines
+        self.mines = mines
+        self.counts = counts
+        _, self.cols, self.rows = mines.shape
+
+    def __len__(self) -> int:
+        return self.mines.shape[0]
+
+    def board(self, index: int) -> Board:
+        # the views keep this batch's arrays alive for as long as the board is
+        return Board.from_layers(
+            self.rows,
+            self.cols,
+            memoryview(self.mines[index].reshape(-1)),
+            memoryview(self.counts[index].reshape(-1)),
+        )
+
+    def games(self) -> Iterator[Game]:
+        for index in range(len(self)):
+            yield Game(
+                number_of_mines=self.number_of_mines,
+                rows=self.rows,
+                cols=self.cols,
+                board=self.board(index),
+            )
+
+
+def generate_board_batch(
+    boards: int,
+    number_of_mines: int,
+    rows: int,
+    cols: int,
+    rng: Optional[np.random.Generator] = None,
+) -> BoardBatch:
+    rng = rng if rng is not None else np.random.default_rng()
+    size = rows * cols
+    if number_of_mines > size:
+        raise ValueError(f"cannot place {number_of_mines} mines in {size} slots")
+
+    mines = np.zeros((boards, size), dtype=np.uint8)
+    if number_of_mines == size:
+        mines[:] = 1
+    elif number_of_mines:
+        # the smallest number_of_mines of a row of random keys is a uniform
+        # sample without replacement
+        keys = rng.random((boards, size))
+        picks = np.argpartition(keys, number_of_mines - 1, axis=1)
+        np.put_along_axis(mines, picks[:, :number_of_mines], 1, axis=1)
+    mines = mines.reshape(boards, cols, rows)
+    return BoardBatch(number_of_mines, mines, count_neighbouring_mines(mines))
+
+
+def iter_games(
+    total: int,
+    number_of_mines: int,
+    rows: int,
+    cols: int,
+    seed: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[Game]:
+    rng = np.random.default_rng(seed)
+    for start in range(0, total, batch_size):
+        batch = generate_board_batch(
+            min(batch_size, total - start), number_of_mines, rows, cols, rng=rng
+        )
+        yield from batch.games()
@@ -0,0 +1,489 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable, Mapping, Sequence
+from random import Random
+from typing import Dict, Optional, Tuple
+
+from board import get_neighbour_table
+from game import PRESETS as GAME_PRESETS
+from game import Game, GameState, resolve_preset
+from helper import (
+    get_constrained_unopened_slots,
+    get_neighbour_positions,
+    get_perimeter_groups,
+    run_CSP_on,
+    run_EPP_on,
+    run_global_CSP_on,
+    run_global_CSP_with_problem_on,
+)
+from player_algo import PlayerAlgo, SolverMode
+from simulation import SimulationConfig, init_worker, play_chunk
+
+# name: (number_of_mines, rows, cols); game's presets plus a dense beginner board
+PRESETS: Dict[str, Tuple[int, int, int]] = {
+    **GAME_PRESETS,
+    "high_density": resolve_preset("beginner", number_of_mines=20),
+}
+# the suite run by default; large and huge boards are covered by --scaling
+DEFAULT_PRESETS = ("beginner", "intermediate", "expert", "high_density")
+# python-constraint enumerates every solution, so keep its groups small
+MAX_CSP_GROUP_SIZE = 12
+# square board sides for --scaling, at SCALING_DENSITY mines per cell
+SCALING_SIDES = (9, 30, 100, 300, 1000)
+SCALING_DENSITY = 0.16
+
+Timing = Dict[str, float]
+Results = Dict[str, Dict[str, Timing]]
+
+
+def make_position(
+    seed: int, number_of_mines: int, rows: int, cols: int, frontier_size: int
+) -> Game:
+    # open random safe slots until the frontier is large enough to be solved
+    rng = Random(seed)
+    game = Game(number_of_mines=number_of_mines, rows=rows, cols=cols, seed=seed)
+    board = game.board
+    safe = [index for index in range(board.size) if not board.mines[index]]
+    rng.shuffle(safe)
+    for index in safe:
+        if (
+            game.state == GameState.WON
+            or len(game.get_constrained_unopened_slots()) >= frontier_size
+        ):
+            break
+        game.open_slot(*board.position(index))
+    return game
+
+
+def compare_global_csp(
+    positions: int,
+    seed: int,
+    number_of_mines: int,
+    rows: int,
+    cols: int,
+    frontier_size: int,
+) -> None:
+    native_time = problem_time = 0.0
+    mismatches = 0
+    for position in range(positions):
+        game = make_position(
+            seed + position, number_of_mines, rows, cols, frontier_size
+        )
+        constrained_slots = get_constrained_unopened_slots(grid=game.grid)
+        remaining_mines = game.number_of_mines - game.get_flag_total()
+
+        start = time.perf_counter()
+        native = run_global_CSP_on(game.grid, constrained_slots, remaining_mines)
+        native_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        problem = run_global_CSP_with_problem_on(
+            game.grid, constrained_slots, remaining_mines
+        )
+        problem_time += time.perf_counter() - start
+
+        # the constraint.Problem version drops results with fewer than 10 solutions
+        if problem and any(
+            abs(native[slot] - probability) > 1e-9
+            for slot, probability in problem.items()
+        ):
+            mismatches += 1
+
+    print(f"run_global_CSP_on over {positions} positions")
+    print(f"native:              {native_time:.3f}s")
+    print(f"constraint.Problem:  {problem_time:.3f}s")
+    print(f"speedup:             {problem_time / max(native_time, 1e-9):.1f}x")
+    print(f"mismatches:          {mismatches}")
+
+
+def _timing(seconds: float, calls: int) -> Timing:
+    return {
+        "seconds": seconds,
+        "calls": calls,
+        "mean_ms": 1000 * seconds / calls if calls else 0.0,
+    }
+
+
+def _timed(func: Callable, *args, **kwargs) -> Tuple[float, object]:
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_construction(
+    seed: int, games: int, number_of_mines: int, rows: int, cols: int
+) -> Timing:
+    start = time.perf_counter()
+    for game_seed in range(seed, seed + games):
+        Game(number_of_mines=number_of_mines, rows=rows, cols=cols, seed=game_seed)
+    return _timing(time.perf_counter() - start, games)
+
+
+def bench_flood_fill(
+    seed: int, games: int, number_of_mines: int, rows: int, cols: int
+) -> Timing:
+    # open the first empty slot of each board, which cascades
+    seconds, calls = 0.0, 0
+    for game_seed in range(seed, seed + games):
+        game = Game(
+            number_of_mines=number_of_mines, rows=rows, cols=cols, seed=game_seed
+        )
+        board = game.board
+        empty = next(
+            (
+                index
+                for index in range(board.size)
+                if not board.mines[index] and not board.counts[index]
+            ),
+            None,
+        )
+        if empty is None:
+            continue
+        elapsed, _ = _timed(game.open_slot, *board.position(empty))
+        seconds += elapsed
+        calls += 1
+    return _timing(seconds, calls)
+
+
+def bench_solvers(
+    seed: int,
+    positions: int,
+    number_of_mines: int,
+    rows: int,
+    cols: int,
+    frontier_size: int,
+) -> Dict[str, Timing]:
+    totals = {
+        name: [0.0, 0]
+        for name in (
+            "get_perimeter_groups",
+            "run_CSP_on",
+            "run_EPP_on",
+            "run_global_CSP_on",
+        )
+    }
+
+    def add(name: str, seconds: float) -> None:
+        totals[name][0] += seconds
+        totals[name][1] += 1
+
+    for position in range(positions):
+        game = make_position(
+            seed + position, number_of_mines, rows, cols, frontier_size
+        )
+        constrained_slots = game.get_constrained_unopened_slots()
+        if not constrained_slots:
+            continue
+        constraint_slots = game.get_constraint_slots()
+
+        elapsed, groups = _timed(
+            get_perimeter_groups, grid=game.grid, perimeter_slots=constrained_slots
+        )
+        add("get_perimeter_groups", elapsed)
+        for group in groups:
+            if len(group) <= MAX_CSP_GROUP_SIZE:
+                elapsed, _ = _timed(
+                    run_CSP_on,
+                    grid=game.grid,
+                    grouped_slots=group,
+                )
+                add("run_CSP_on", elapsed)
+            elapsed, _ = _timed(run_EPP_on, grid=game.grid, grouped_slots=group)
+            add("run_EPP_on", elapsed)
+
+        elapsed, _ = _timed(
+            run_global_CSP_on,
+            grid=game.grid,
+            constrained_slots=constrained_slots,
+            remaining_mines=game.number_of_mines - game.get_flag_total(),
+            constraint_slots=constraint_slots,
+        )
+        add("run_global_CSP_on", elapsed)
+    return {name: _timing(seconds, calls) for name, (seconds, calls) in totals.items()}
+
+
+def bench_games(
+    seed: int,
+    games: int,
+    number_of_mines: int,
+    rows: int,
+    cols: int,
+    solver_mode: SolverMode,
+) -> Timing:
+    config = SimulationConfig(
+        number_of_mines=number_of_mines,
+        rows=rows,
+        cols=cols,
+        solver_mode=solver_mode,
+    )
+    # start cold so earlier presets' solved patterns do not flatter later ones
+    init_worker(None)
+    elapsed, result = _timed(play_chunk, seed, games, config)
+    timing = _timing(elapsed, result.games)
+    timing["won"] = result.won
+    timing["win_rate"] = result.win_rate
+    return timing
+
+
+def bench_scaling(
+    seed: int = 0,
+    sides: Sequence[int] = SCALING_SIDES,
+    moves: int = 50,
+    time_budget: float = 1.0,
+) -> Results:
+    """Construction time, memory per cell and per-move time on growing square
+    boards, over component solver games until `moves` moves are played. Move
+    time is also given per cell the move had to look at: the frontier it
+    started from and the cells it opened."""
+    results = {}
+    for side in sides:
+        number_of_mines = round(side * side * SCALING_DENSITY)
+        board = {"number_of_mines": number_of_mines, "rows": side, "cols": side}
+        # tracing slows allocation down, so memory is measured on a second
+        # construction, with the shared neighbour tables rebuilt and counted
+        elapsed, game = _timed(Game, seed=seed, **board)
+        get_neighbour_table.cache_clear()
+        get_neighbour_positions.cache_clear()
+        tracemalloc.start()
+        game = Game(seed=seed, **board)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        construction = _timing(elapsed, 1)
+        construction["bytes_per_cell"] = memory / game.board.size
+
+        player = PlayerAlgo(
+            solver_mode=SolverMode.components,
+            rng=Random(seed),
+            time_budget=time_budget,
+        )
+        seconds, calls, cells = 0.0, 0, 0
+        game_seed = seed
+        while calls < moves:
+            if game.state not in [GameState.UNSTARTED, GameState.IN_PROGRESS]:
+                game_seed += 1
+                game = Game(seed=game_seed, **board)
+            unopened = game.unopened
+            cells += max(len(game.board.frontier), 1)
+            elapsed, _ = _timed(player.play_step, game)
+            cells += unopened - game.unopened
+            seconds += elapsed
+            calls += 1
+        move_timing = _timing(seconds, calls)
+        move_timing["games"] = game_seed - seed + 1
+        move_timing["us_per_cell"] = 1e6 * seconds / cells if cells else 0.0
+        results[f"{side}x{side}"] = {
+            "construction": construction,
+            "moves": move_timing,
+        }
+    return results
+
+
+def print_scaling(results: Results) -> None:
+    print(
+        f"{'board':<12}{'construct ms':>14}{'bytes/cell':>12}{'moves':>8}"
+        f"{'games':>7}{'ms/move':>10}{'us/cell':>10}"
+    )
+    for board, timings in results.items():
+        construction, moves = timings["construction"], timings["moves"]
+        print(
+            f"{board:<12}{construction['mean_ms']:>14.2f}"
+            f"{construction['bytes_per_cell']:>12.1f}{moves['calls']:>8}"
+            f"{moves['games']:>7}{moves['mean_ms']:>10.2f}{moves['us_per_cell']:>10.2f}"
+        )
+
+
+def run_suite(
+    presets: Sequence[str],
+    seed: int = 0,
+    games: int = 100,
+    positions: int = 20,
+    frontier_size: int = 14,
+    solver_modes: Sequence[SolverMode] = tuple(SolverMode),
+) -> Results:
+    results = {}
+    for preset in presets:
+        number_of_mines, rows, cols = PRESETS[preset]
+        board = (seed, games, number_of_mines, rows, cols)
+        timings = {
+            "construction": bench_construction(*board),
+            "flood_fill": bench_flood_fill(*board),
+        }
+        timings.update(
+            bench_solvers(seed, positions, number_of_mines, rows, cols, frontier_size)
+        )
+        for mode in solver_modes:
+            timings[f"games_{mode.name}"] = bench_games(*board, solver_mode=mode)
+        results[preset] = timings
+    return results
+
+
+def print_results(results: Results) -> None:
+    print(
+        f"{'preset':<14}{'benchmark':<24}{'calls':>8}{'seconds':>10}{'mean ms':>10}  win rate"
+    )
+    for preset, timings in results.items():
+        for name, timing in timings.items():
+            win_rate = f"  {timing['win_rate']:.3f}" if "win_rate" in timing else ""
+            print(
+                f"{preset:<14}{name:<24}{timing['calls']:>8}{timing['seconds']:>10.3f}"
+                f"{timing['mean_ms']:>10.3f}{win_rate}"
+            )
+
+
+def compare_results(
+    results: Results, baseline: Results, max_win_rate_drop: float
+) -> bool:
+    """Print each timing's speedup over the baseline. Returns False if any
+    win rate fell by more than max_win_rate_drop."""
+    ok = True
+    print(
+        f"{'preset':<14}{'benchmark':<24}{'baseline ms':>12}{'ms':>10}{'speedup':>9}  win rate"
+    )
+    for preset, timings in results.items():
+        for name, timing in timings.items():
+            before = baseline.get(preset, {}).get(name)
+            if before is None:
+                continue
+            speedup = (
+                before["mean_ms"] / timing["mean_ms"] if timing["mean_ms"] else 0.0
+            )
+            line = (
+                f"{preset:<14}{name:<24}{before['mean_ms']:>12.3f}"
+                f"{timing['mean_ms']:>10.3f}{speedup:>8.2f}x"
+            )
+            if "win_rate" in timing:
+                change = timing["win_rate"] - before["win_rate"]
+                line += f"  {before['win_rate']:.3f} -> {timing['win_rate']:.3f}"
+                if change < -max_win_rate_drop:
+                    line += "  REGRESSION"
+                    ok = False
+            print(line)
+    return ok
+
+
+def load_report(path: str) -> Mapping:
+    with open(path) as report_file:
+        return json.load(report_file)
+
+
+def write_report(path: str, report: Mapping) -> None:
+    with open(path, "w") as report_file:
+        json.dump(report, report_file, indent=1)
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the bot and its solvers")
+    parser.add_argument(
+        "--presets", nargs="+", choices=list(PRESETS), default=list(DEFAULT_PRESETS)
+    )
+    parser.add_argument(
+        "--solver-modes",
+        nargs="+",
+        choices=[mode.name for mode in SolverMode],
+        default=[mode.name for mode in SolverMode],
+    )
+    parser.add_argument(
+        "--games", type=int, default=100, help="games per preset and solver mode"
+    )
+    parser.add_argument(
+        "--positions", type=int, default=20, help="mid-game positions per preset"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--frontier", type=int, default=14)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument(
+        "--save-baseline", help="write the results as a baseline to this JSON file"
+    )
+    parser.add_argument("--baseline", help="compare against a baseline JSON file")
+    parser.add_argument(
+        "--max-win-rate-drop",
+        type=float,
+        default=0.0,
+        help="fail the comparison if a win rate falls by more than this",
+    )
+    parser.add_argument(
+        "--compare-problem",
+        action="store_true",
+        help="only time run_global_CSP_on against the constraint.Problem version",
+    )
+    parser.add_argument(
+        "--mines", type=int, help="--compare-problem board, intermediate by default"
+    )
+    parser.add_argument("--rows", type=int)
+    parser.add_argument("--cols", type=int)
+    parser.add_argument(
+        "--scaling",
+        action="store_true",
+        help="only time construction and moves on boards up to 1000x1000",
+    )
+    parser.add_argument(
+        "--moves", type=int, default=50, help="moves per board with --scaling"
+    )
+    args = parser.parse_args(argv)
+
+    if args.scaling:
+        results = bench_scaling(seed=args.seed, moves=args.moves)
+        print_scaling(results)
+        if args.output:
+            write_report(
+                args.output, {"python": platform.python_version(), "results": results}
+            )
+        return
+
+    if args.compare_problem:
+        try:
+            number_of_mines, rows, cols = resolve_preset(
+                "intermediate", args.mines, args.rows, args.cols
+            )
+        except ValueError as error:
+            parser.error(str(error))
+        compare_global_csp(
+            positions=args.positions,
+            seed=args.seed,
+            number_of_mines=number_of_mines,
+            rows=rows,
+            cols=cols,
+            frontier_size=args.frontier,
+        )
+        return
+
+    settings = {
+        "seed": args.seed,
+        "games": args.games,
+        "positions": args.positions,
+        "frontier": args.frontier,
+    }
+    results = run_suite(
+        presets=args.presets,
+        seed=args.seed,
+        games=args.games,
+        positions=args.positions,
+        frontier_size=args.frontier,
+        solver_modes=[SolverMode[name] for name in args.solver_modes],
+    )
+    print_results(results)
+    report = {
+        "python": platform.python_version(),
+        "settings": settings,
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            write_report(path, report)
+
+    if args.baseline:
+        baseline = load_report(args.baseline)
+        if baseline["settings"] != settings:
+            # win rates are only comparable over the same seeded games
+            print(f"warning: baseline settings differ: {baseline['settings']}")
+        print()
+        if not compare_results(results, baseline["results"], args.max_win_rate_drop):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from collections.abc import Iterator, Sequence
+from functools import lru_cache
+from typing import Tuple
+
+from board import Board, get_neighbour_table
+
+# past this many cells every mask operation costs more than the Python loops
+# it replaces, so larger boards keep using Board's per-cell arrays
+BITBOARD_MAX_CELLS = 1024
+
+# turns a 0/1 (or 0-8 count) byte layer into the text of a binary number
+_LAYER_BITS = bytes.maketrans(bytes(range(9)), b"011111111")
+
+
+@lru_cache(maxsize=8)
+def get_neighbour_masks(rows: int, cols: int) -> Sequence[int]:
+    # bit n of masks[i] is set when cell n neighbours cell i (same indexing as Board)
+    return tuple(
+        sum(1 << neighbour for neighbour in neighbours)
+        for neighbours in get_neighbour_table(rows, cols)
+    )
+
+
+@lru_cache(maxsize=8)
+def get_shift_masks(rows: int, cols: int) -> Tuple[int, int, int, int]:
+    # (all cells, cells not in the first row, not in the last row, on the edge)
+    full = (1 << rows * cols) - 1
+    first_row = sum(1 << col * rows for col in range(cols))
+    last_row = first_row << rows - 1
+    edge = (
+        first_row | last_row | (1 << rows) - 1 | ((1 << rows) - 1) << rows * (cols - 1)
+    )
+    return full, full & ~first_row, full & ~last_row, edge
+
+
+def layer_to_mask(layer: Sequence[int]) -> int:
+    # bit i is set when layer[i] is non-zero
+    if not len(layer):
+        return 0
+    return int(bytes(layer)[::-1].translate(_LAYER_BITS), 2)
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    # set bit positions, lowest first
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+class BitBoard:
+    """Snapshot of a Board's layers as integer bitmasks, so neighbourhood
+    queries are a mask and a popcount instead of a loop over slots"""
+
+    rows: int
+    cols: int
+    neighbour_masks: Sequence[int]
+    counts: Sequence[int]
+    mines: int
+    opened: int
+    flagged: int
+    # opened cells showing a number above zero
+    numbered: int
+    # unopened, unflagged cells
+    unknown: int
+
+    def __init__(self, board: Board):
+        self.rows = board.rows
+        self.cols = board.cols
+        self.neighbour_masks = get_neighbour_masks(board.rows, board.cols)
+        self.counts = board.counts
+        self.mines = layer_to_mask(board.mines)
+        self.opened = layer_to_mask(board.opened)
+        self.flagged = layer_to_mask(board.flagged)
+        self.numbered = self.opened & layer_to_mask(board.counts)
+        full, self._not_first_row, self._not_last_row, self.edge = get_shift_masks(
+            board.rows, board.cols
+        )
+        self._full = full
+        self.unknown = full & ~(self.opened | self.flagged)
+
+    def dilate(self, mask: int) -> int:
+        # mask plus every cell neighbouring it
+        column = (
+            mask | (mask << 1) & self._not_first_row | (mask >> 1) & self._not_last_row
+        )
+        return (column | column << self.rows | column >> self.rows) & self._full
+
+    def frontier(self) -> int:
+        # unknown cells next to at least one opened cell
+        return self.dilate(self.opened) & self.unknown
+
+    def unconstrained(self) -> int:
+        # unknown cells with no opened neighbour
+        return self.unknown & ~self.dilate(self.opened)
+
+    def constraints(self) -> int:
+        # opened cells next to at least one unknown cell
+        return self.dilate(self.unknown) & self.opened
+
+    def flags_around(self, index: int) -> int:
+        return (self.neighbour_masks[index] & self.flagged).bit_count()
+
+    def unopened_around(self, index: int) -> int:
+        return (self.neighbour_masks[index] & ~self.opened).bit_count()
+
+    def opened_around(self, index: int) -> int:
+        return (self.neighbour_masks[index] & self.opened).bit_count()
+
+    def is_unconstrained(self, index: int) -> bool:
+        return not self.neighbour_masks[index] & self.opened
+
+    def risk_score(self, index: int) -> Tuple[int, int]:
+        # fewer constraints first, then lower risk density
+        neighbours = self.neighbour_masks[index]
+        number_of_constraints = (neighbours & self.opened).bit_count()
+        number_adjacent = (neighbours & self.numbered).bit_count()
+        unopened_adjacent = (neighbours & ~self.opened).bit_count()
+        risk_density = (number_adjacent + unopened_adjacent) / neighbours.bit_count()
+        return (number_of_constraints, int(risk_density * 100))
+
+    def check_config(self, flags: int = 0) -> bool:
+        # with these extra flags placed, every opened number next to them (or
+        # every opened number, when there are none) has at most its count of
+        # flags around it and enough unknown cells left for the rest
+        flagged = self.flagged | flags
+        unknown = self.unknown & ~flags
+        cells = self.dilate(flags) & self.opened if flags else self.opened
+        for index in iter_bits(cells):
+            neighbours = self.neighbour_masks[index]
+            placed = (neighbours & flagged).bit_count()
+            if (
+                not placed
+                <= self.counts[index]
+                <= placed + (neighbours & unknown).bit_count()
+            ):
+                return False
+        return True
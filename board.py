@@ -0,0 +1,536 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from bisect import insort
+from collections.abc import Iterable, Iterator, MutableSequence, Sequence
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from models import SlotBase
+
+NeighbourTable = Sequence[Tuple[int, ...]]
+# past this many cells, per-cell tables (neighbours, slot views) are built on
+# demand instead of up front, so memory stays a few bytes per cell
+MAX_TABLE_CELLS = 1 << 16
+# most unconstrained cells a board remembers finding, see iter_unconstrained
+MAX_TRACKED_UNCONSTRAINED = 4096
+# what a cell shows, for cell_key: an opened cell shows its count (0-8)
+FLAGGED_STATE = 9
+MASK_64 = (1 << 64) - 1
+
+
+def cell_key(index: int, state: int) -> int:
+    # a fixed 64-bit value per (cell, what it shows), mixed by splitmix64;
+    # Board.position_hash XORs these together
+    key = (index * 10 + state + 1) * 0x9E3779B97F4A7C15 & MASK_64
+    key = (key ^ key >> 30) * 0xBF58476D1CE4E5B9 & MASK_64
+    key = (key ^ key >> 27) * 0x94D049BB133111EB & MASK_64
+    return key ^ key >> 31
+
+
+class ComputedNeighbourTable(Sequence):
+    """Neighbour table of a board too large to precompute, built per lookup
+    in the same order as get_neighbour_table"""
+
+    rows: int
+    cols: int
+
+    def __init__(self, rows: int, cols: int):
+        self.rows = rows
+        self.cols = cols
+
+    def __len__(self) -> int:
+        return self.rows * self.cols
+
+    def __getitem__(self, index: int) -> Tuple[int, ...]:
+        rows, cols = self.rows, self.cols
+        if not 0 <= index < rows * cols:
+            raise IndexError(index)
+        col, row = divmod(index, rows)
+        if 0 < row < rows - 1 and 0 < col < cols - 1:
+            left, right = index - rows, index + rows
+            return (
+                left - 1,
+                left,
+                left + 1,
+                index - 1,
+                index + 1,
+                right - 1,
+                right,
+                right + 1,
+            )
+        return tuple(
+            y * rows + x
+            for y in range(max(col - 1, 0), min(col + 2, cols))
+            for x in range(max(row - 1, 0), min(row + 2, rows))
+            if x != row or y != col
+        )
+
+
+@lru_cache(maxsize=8)
+def get_neighbour_table(rows: int, cols: int) -> NeighbourTable:
+    # cells are indexed column-major (col * rows + row) to mirror grid[col][row]
+    if rows * cols > MAX_TABLE_CELLS:
+        return ComputedNeighbourTable(rows, cols)
+    table = []
+    for col in range(cols):
+        for row in range(rows):
+            neighbours = []
+            for dt_y in range(-1, 2):
+                for dt_x in range(-1, 2):
+                    x = row + dt_x
+                    y = col + dt_y
+                    if (
+                        (dt_x == 0 and dt_y == 0)
+                        or (x < 0 or y < 0)
+                        or (x >= rows or y >= cols)
+                    ):
+                        continue
+                    neighbours.append(y * rows + x)
+            table.append(tuple(neighbours))
+    return tuple(table)
+
+
+def count_neighbouring_mines(mines: np.ndarray) -> np.ndarray:
+    # for (boards, cols, rows) arrays: sum the 3x3 window around every cell,
+    # then drop the cell itself
+    padded = np.pad(mines, ((0, 0), (1, 1), (1, 1))).astype(np.uint8)
+    cols, rows = mines.shape[1:]
+    counts = np.zeros_like(mines, dtype=np.uint8)
+    for dt_y in range(3):
+        for dt_x in range(3):
+            counts += padded[:, dt_y : dt_y + cols, dt_x : dt_x + rows]
+    counts -= mines
+    counts[mines == 1] = 0
+    return counts
+
+
+class Board:
+    rows: int
+    cols: int
+    size: int
+    neighbours: NeighbourTable
+    mines: MutableSequence[int]
+    counts: MutableSequence[int]
+    opened: bytearray
+    flagged: bytearray
+    flag_count: int
+    # unopened, unflagged cells next to at least one opened cell
+    frontier: Set[int]
+    # opened numbered cells that still have unopened, unflagged neighbours
+    constraint_cells: Set[int]
+    # see position_hash; None until recomputed after a bulk change
+    _position_hash: Optional[int]
+
+    def __init__(self, rows: int, cols: int, mines: Iterable[Tuple[int, int]]):
+        self._allocate(rows, cols)
+        self.mines = bytearray(self.size)
+        self.counts = bytearray(self.size)
+        self.place_mines(mines)
+
+    @classmethod
+    def from_layers(
+        cls,
+        rows: int,
+        cols: int,
+        mines: MutableSequence[int],
+        counts: MutableSequence[int],
+    ) -> "Board":
+        # wrap precomputed mine and count layers (e.g. memoryviews into a batch)
+        board = cls.__new__(cls)
+        board._allocate(rows, cols)
+        board.mines = mines
+        board.counts = counts
+        return board
+
+    def copy(self) -> "Board":
+        board = Board.from_layers(
+            self.rows, self.cols, bytearray(self.mines), bytearray(self.counts)
+        )
+        board.opened[:] = self.opened
+        board.flagged[:] = self.flagged
+        board.flag_count = self.flag_count
+        board.frontier = set(self.frontier)
+        board.constraint_cells = set(self.constraint_cells)
+        board._unconstrained = list(self._unconstrained)
+        board._unconstrained_scanned = self._unconstrained_scanned
+        board._position_hash = self._position_hash
+        return board
+
+    def _allocate(self, rows: int, cols: int) -> None:
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.neighbours = get_neighbour_table(rows, cols)
+        self.opened = bytearray(self.size)
+        self.flagged = bytearray(self.size)
+        self.flag_count = 0
+        self.frontier = set()
+        self.constraint_cells = set()
+        self._components = None
+        # unconstrained cells found so far, in index order, and the index
+        # below which they are all of them (see iter_unconstrained)
+        self._unconstrained: List[int] = []
+        self._unconstrained_scanned = 0
+        self._position_hash = 0
+
+    def place_mines(self, mines: Iterable[Tuple[int, int]]) -> None:
+        for row, col in mines:
+            self.mines[col * self.rows + row] = 1
+        self.compute_counts()
+
+    def compute_counts(self) -> None:
+        mines = self.mines
+        counts = self.counts
+        if 1 in self.opened:
+            # opened cells show the counts about to change
+            self._position_hash = None
+        if self.size > MAX_TABLE_CELLS:
+            layer = np.frombuffer(mines, dtype=np.uint8).reshape(
+                1, self.cols, self.rows
+            )
+            counts[:] = count_neighbouring_mines(layer).tobytes()
+            return
+        for index, neighbours in enumerate(self.neighbours):
+            if not mines[index]:
+                counts[index] = sum(mines[n] for n in neighbours)
+
+    def index(self, row: int, col: int) -> int:
+        return col * self.rows + row
+
+    def position(self, index: int) -> Tuple[int, int]:
+        col, row = divmod(index, self.rows)
+        return row, col
+
+    def get_neighbour_positions(self, row: int, col: int) -> Sequence[Tuple[int, int]]:
+        return [self.position(n) for n in self.neighbours[self.index(row, col)]]
+
+    def is_unknown(self, index: int) -> bool:
+        return not self.opened[index] and not self.flagged[index]
+
+    def has_unknown_neighbour(self, index: int) -> bool:
+        opened, flagged = self.opened, self.flagged
+        return any(not opened[n] and not flagged[n] for n in self.neighbours[index])
+
+    def get_unknown_neighbours(self, index: int) -> List[int]:
+        opened, flagged = self.opened, self.flagged
+        return [n for n in self.neighbours[index] if not opened[n] and not flagged[n]]
+
+    def count_flagged_neighbours(self, index: int) -> int:
+        flagged = self.flagged
+        return sum(flagged[n] for n in self.neighbours[index])
+
+    def count_neighbours(self, index: int) -> Tuple[int, int, int]:
+        # (flagged, unopened, opened) neighbours in one pass; unopened
+        # includes flags
+        opened, flagged = self.opened, self.flagged
+        flags = opened_count = 0
+        neighbours = self.neighbours[index]
+        for n in neighbours:
+            if opened[n]:
+                opened_count += 1
+            elif flagged[n]:
+                flags += 1
+        return flags, len(neighbours) - opened_count, opened_count
+
+    def scan_neighbours(self, index: int) -> Tuple[List[int], int]:
+        # unknown neighbours and the number of flagged ones, in one pass
+        opened, flagged = self.opened, self.flagged
+        unknown = []
+        flags = 0
+        for n in self.neighbours[index]:
+            if flagged[n]:
+                flags += 1
+            elif not opened[n]:
+                unknown.append(n)
+        return unknown, flags
+
+    def is_unconstrained(self, index: int) -> bool:
+        # unknown, with no opened neighbour
+        opened = self.opened
+        return self.is_unknown(index) and not any(
+            opened[n] for n in self.neighbours[index]
+        )
+
+    def risk_score(self, index: int) -> Tuple[int, int]:
+        # same ordering as BitBoard.risk_score
+        opened, counts = self.opened, self.counts
+        neighbours = self.neighbours[index]
+        number_of_constraints = sum(opened[n] for n in neighbours)
+        number_adjacent = sum(1 for n in neighbours if opened[n] and counts[n])
+        unopened_adjacent = len(neighbours) - number_of_constraints
+        risk_density = (number_adjacent + unopened_adjacent) / len(neighbours)
+        return (number_of_constraints, int(risk_density * 100))
+
+    def iter_unconstrained(self) -> Iterator[int]:
+        # unconstrained cells in index order. Cells only stop being
+        # unconstrained as a game is played (unflagging aside), so the cells
+        # found by earlier scans are rechecked and the scan resumes where
+        # they end; over a game each cell is scanned once, as long as callers
+        # take fewer than MAX_TRACKED_UNCONSTRAINED cells at a time
+        found = [index for index in self._unconstrained if self.is_unconstrained(index)]
+        self._unconstrained = found
+        yield from found
+        for index in range(self._unconstrained_scanned, self.size):
+            if not self.is_unconstrained(index):
+                continue
+            if len(found) < MAX_TRACKED_UNCONSTRAINED:
+                found.append(index)
+                self._unconstrained_scanned = index + 1
+            yield index
+        if len(found) < MAX_TRACKED_UNCONSTRAINED:
+            self._unconstrained_scanned = self.size
+
+    def _refresh_constraint(self, index: int) -> None:
+        if (
+            self.opened[index]
+            and self.counts[index]
+            and self.has_unknown_neighbour(index)
+        ):
+            self.constraint_cells.add(index)
+        else:
+            self.constraint_cells.discard(index)
+
+    def _refresh_frontier(self, index: int) -> None:
+        if self.is_unknown(index) and any(
+            self.opened[n] for n in self.neighbours[index]
+        ):
+            self.frontier.add(index)
+        else:
+            self.frontier.discard(index)
+
+    @property
+    def position_hash(self) -> int:
+        # XOR of cell_key over what every opened or flagged cell shows, kept
+        # up to date as cells change, so it costs nothing to read
+        if self._position_hash is None:
+            self._position_hash = self.compute_position_hash()
+        return self._position_hash
+
+    def compute_position_hash(self) -> int:
+        position_hash = 0
+        opened, flagged, counts = self.opened, self.flagged, self.counts
+        for index in range(self.size):
+            if opened[index]:
+                position_hash ^= cell_key(index, counts[index])
+            if flagged[index]:
+                position_hash ^= cell_key(index, FLAGGED_STATE)
+        return position_hash
+
+    def reset_position_hash(self) -> None:
+        # for callers that write opened or flagged directly
+        self._position_hash = None
+
+    def _toggle_position(self, index: int, state: int) -> None:
+        if self._position_hash is not None:
+            self._position_hash ^= cell_key(index, state)
+
+    def open_cell(self, index: int) -> None:
+        opened, flagged = self.opened, self.flagged
+        opened[index] = 1
+        self._toggle_position(index, self.counts[index])
+        self.frontier.discard(index)
+        self._components = None
+        has_unknown = False
+        for neighbour in self.neighbours[index]:
+            if opened[neighbour]:
+                if neighbour in self.constraint_cells:
+                    self._refresh_constraint(neighbour)
+            elif not flagged[neighbour]:
+                has_unknown = True
+                self.frontier.add(neighbour)
+        if has_unknown and self.counts[index]:
+            self.constraint_cells.add(index)
+
+    def set_opened(self, index: int, value: bool) -> None:
+        if value:
+            if not self.opened[index]:
+                self.open_cell(index)
+            return
+        if self.opened[index]:
+            self._toggle_position(index, self.counts[index])
+        self.opened[index] = 0
+        self._components = None
+        self._unconstrained = []
+        self._unconstrained_scanned = 0
+        self._refresh_constraint(index)
+        self._refresh_frontier(index)
+        for neighbour in self.neighbours[index]:
+            self._refresh_constraint(neighbour)
+            self._refresh_frontier(neighbour)
+
+    def set_flagged(self, index: int, value: bool) -> None:
+        if bool(self.flagged[index]) == bool(value):
+            return
+        self.flagged[index] = 1 if value else 0
+        self.flag_count += 1 if value else -1
+        self._toggle_position(index, FLAGGED_STATE)
+        self._components = None
+        if (
+            not value
+            and index < self._unconstrained_scanned
+            and self.is_unconstrained(index)
+        ):
+            insort(self._unconstrained, index)
+        self._refresh_frontier(index)
+        for neighbour in self.neighbours[index]:
+            if self.opened[neighbour]:
+                self._refresh_constraint(neighbour)
+
+    def clear_frontier(self) -> None:
+        self.frontier.clear()
+        self.constraint_cells.clear()
+        self._components = None
+
+    def get_components(self) -> Sequence[Sequence[int]]:
+        # frontier cells sharing a constraint cell end up in the same component
+        if self._components is not None:
+            return self._components
+
+        parents = {index: index for index in self.frontier}
+
+        def find(index: int) -> int:
+            while parents[index] != index:
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+
+        for constraint in self.constraint_cells:
+            unknown = [n for n in self.neighbours[constraint] if n in parents]
+            root = find(unknown[0])
+            for neighbour in unknown[1:]:
+                other = find(neighbour)
+                if other != root:
+                    parents[other] = root
+
+        members: Dict[int, List[int]] = {}
+        for index in sorted(self.frontier):
+            members.setdefault(find(index), []).append(index)
+        self._components = list(members.values())
+        return self._components
+
+    def make_grid(self) -> Sequence[Sequence["SlotView"]]:
+        if self.size > MAX_TABLE_CELLS:
+            return LazyGrid(self)
+        return [
+            [SlotView(self, col * self.rows + row) for row in range(self.rows)]
+            for col in range(self.cols)
+        ]
+
+
+def encode_mine_bits(board: Board) -> bytes:
+    # one bit per cell, in index order
+    bits = bytearray((board.size + 7) // 8)
+    for index in range(board.size):
+        if board.mines[index]:
+            bits[index >> 3] |= 1 << (index & 7)
+    return bytes(bits)
+
+
+def decode_mine_bits(rows: int, cols: int, bits: Sequence[int]) -> Board:
+    if len(bits) != (rows * cols + 7) // 8:
+        raise ValueError(f"{len(bits)} bytes do not match a {rows}x{cols} board")
+    mines = []
+    for index in range(rows * cols):
+        if bits[index >> 3] >> (index & 7) & 1:
+            col, row = divmod(index, rows)
+            mines.append((row, col))
+    return Board(rows, cols, mines)
+
+
+def encode_board_id(board: Board) -> str:
+    encoded = urlsafe_b64encode(encode_mine_bits(board)).decode("ascii").rstrip("=")
+    return f"{board.rows}x{board.cols}-{encoded}"
+
+
+def decode_board_id(board_id: str) -> Board:
+    shape, _, encoded = board_id.partition("-")
+    rows, _, cols = shape.partition("x")
+    rows, cols = int(rows), int(cols)
+    bits = urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+    if len(bits) != (rows * cols + 7) // 8:
+        raise ValueError(f"board id {board_id!r} does not match a {rows}x{cols} board")
+    return decode_mine_bits(rows, cols, bits)
+
+
+class SlotView(SlotBase):
+    """Slot adapter reading and writing through to a Board's arrays"""
+
+    __slots__ = ("board", "index", "row", "col", "key")
+
+    board: Board
+    index: int
+
+    def __init__(self, board: Board, index: int):
+        self.board = board
+        self.index = index
+        self.row, self.col = board.position(index)
+        self.key = self.col << 16 | self.row
+
+    @property
+    def has_mine(self) -> bool:
+        return bool(self.board.mines[self.index])
+
+    @property
+    def number_of_mines_around(self) -> int:
+        return self.board.counts[self.index]
+
+    @property
+    def is_opened(self) -> bool:
+        return bool(self.board.opened[self.index])
+
+    @is_opened.setter
+    def is_opened(self, value: bool) -> None:
+        self.board.set_opened(self.index, value)
+
+    @property
+    def is_flagged(self) -> bool:
+        return bool(self.board.flagged[self.index])
+
+    @is_flagged.setter
+    def is_flagged(self, value: bool) -> None:
+        self.board.set_flagged(self.index, value)
+
+
+class LazyColumn(Sequence):
+    board: Board
+    col: int
+
+    def __init__(self, board: Board, col: int, slots: Dict[int, SlotView]):
+        self.board = board
+        self.col = col
+        self._slots = slots
+
+    def __len__(self) -> int:
+        return self.board.rows
+
+    def __getitem__(self, row: int) -> SlotView:
+        if not 0 <= row < self.board.rows:
+            raise IndexError(row)
+        index = self.col * self.board.rows + row
+        slot = self._slots.get(index)
+        if slot is None:
+            slot = self._slots[index] = SlotView(self.board, index)
+        return slot
+
+
+class LazyGrid(Sequence):
+    """grid[col][row] over a large Board, making each SlotView on first use"""
+
+    board: Board
+
+    def __init__(self, board: Board):
+        self.board = board
+        self._slots: Dict[int, SlotView] = {}
+        self._columns: Dict[int, LazyColumn] = {}
+
+    def __len__(self) -> int:
+        return self.board.cols
+
+    def __getitem__(self, col: int) -> LazyColumn:
+        column = self._columns.get(col)
+        if column is None:
+            if not 0 <= col < self.board.cols:
+                raise IndexError(col)
+            column = self._columns[col] = LazyColumn(self.board, col, self._slots)
+        return column
@@ -0,0 +1,75 @@
+import queue
+import threading
+from typing import Optional, Tuple, Union
+
+from game import Game
+from player_algo import MoveResult, PlayerAlgo
+
+Outcome = Union[Optional[MoveResult], BaseException]
+
+
+class BotWorker:
+    """Runs PlayerAlgo.play_step on a background thread, one move at a time,
+    so a long solve never holds up the thread drawing the game.
+
+    Each request solves a copy of the game; the caller applies the returned
+    move to its own game with MoveResult.apply."""
+
+    player: PlayerAlgo
+
+    def __init__(self, player: PlayerAlgo):
+        self.player = player
+        self._requests: "queue.Queue[Optional[Tuple[int, Game]]]" = queue.Queue()
+        self._results: "queue.Queue[Tuple[int, Outcome]]" = queue.Queue()
+        # results of requests made before the last discard are dropped
+        self._generation = 0
+        self._busy = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def busy(self) -> bool:
+        return self._busy
+
+    def request(self, game: Game) -> bool:
+        # returns False while the previous move is still being solved
+        if self._busy:
+            return False
+        self._busy = True
+        self._requests.put((self._generation, game.copy()))
+        return True
+
+    def poll(self) -> Optional[MoveResult]:
+        # the solved move, once; None while solving, when idle, or when the
+        # game was already over
+        while True:
+            try:
+                generation, outcome = self._results.get_nowait()
+            except queue.Empty:
+                return None
+            if generation == self._generation:
+                break
+        self._busy = False
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def discard(self) -> None:
+        # forget the move being solved, e.g. when a new game starts
+        self._generation += 1
+        self._busy = False
+
+    def stop(self) -> None:
+        self._requests.put(None)
+
+    def _run(self) -> None:
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            generation, game = request
+            try:
+                outcome = self.player.play_step(game)
+            except Exception as error:
+                outcome = error
+            self._results.put((generation, outcome))
@@ -0,0 +1,221 @@
+import argparse
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from game import COLS, NUMBER_OF_MINES, PRESETS, ROWS, Game, GameState, resolve_preset
+from opening_book import position_key, write_book
+from player_algo import PlayerAlgo, SolverMode
+from simulation import DEFAULT_CHUNK_SIZE
+
+DEFAULT_MAX_OPENED = 8
+DEFAULT_MIN_VISITS = 20
+
+
+class PositionStats:
+    """The guesses tied for the lowest mine probability in a position, and
+    how often each held a zero in the games that reached it"""
+
+    # cell indices, ascending
+    candidates: List[int]
+    probability: float
+    visits: int
+    zeros: List[int]
+
+    def __init__(self, candidates: List[int], probability: float):
+        self.candidates = candidates
+        self.probability = probability
+        self.visits = 0
+        self.zeros = [0] * len(candidates)
+
+    def record(self, game: Game) -> None:
+        board = game.board
+        self.visits += 1
+        for i, index in enumerate(self.candidates):
+            if not board.mines[index] and not board.counts[index]:
+                self.zeros[i] += 1
+
+    def best(self) -> int:
+        # safest guess that most often opens a zero and cascades, lowest
+        # index on ties
+        return self.candidates[
+            max(range(len(self.candidates)), key=lambda i: (self.zeros[i], -i))
+        ]
+
+    def merge(self, other: "PositionStats") -> None:
+        self.visits += other.visits
+        for i, zeros in enumerate(other.zeros):
+            self.zeros[i] += zeros
+
+
+Positions = Dict[int, Optional[PositionStats]]
+
+
+def find_guesses(player: PlayerAlgo, game: Game) -> Optional[PositionStats]:
+    # None when the position has a certain move, which the solvers will find
+    probabilities = player.advise(game)
+    if not probabilities:
+        return None
+    lowest = min(probabilities.values())
+    if lowest < 1e-6 or max(probabilities.values()) > 1 - 1e-6:
+        return None
+    board = game.board
+    candidates = sorted(
+        board.index(row, col)
+        for (row, col), probability in probabilities.items()
+        if probability - lowest < 1e-6
+    )
+    return PositionStats(candidates, lowest)
+
+
+def play_chunk(
+    seed: int,
+    games: int,
+    number_of_mines: int,
+    rows: int,
+    cols: int,
+    max_opened: int,
+    solver_mode: SolverMode,
+) -> Positions:
+    # early guesses open the current best candidate, so the positions the
+    # finished book leads to are the ones visited most
+    player = PlayerAlgo(solver_mode=solver_mode, rng=random.Random(seed))
+    board_seeds = random.Random(seed)
+    positions: Positions = {}
+    for _ in range(games):
+        game = Game(
+            number_of_mines=number_of_mines,
+            rows=rows,
+            cols=cols,
+            seed=board_seeds.getrandbits(64),
+        )
+        board = game.board
+        while (
+            game.state in [GameState.UNSTARTED, GameState.IN_PROGRESS]
+            and board.size - game.unopened <= max_opened
+        ):
+            key = position_key(board)
+            if key not in positions:
+                positions[key] = find_guesses(player, game)
+            stats = positions[key]
+            if stats is None:
+                player.play_step(game)
+                continue
+            stats.record(game)
+            game.open_slot(*board.position(stats.best()))
+    return positions
+
+
+def build_book(
+    games: int,
+    number_of_mines: int = NUMBER_OF_MINES,
+    rows: int = ROWS,
+    cols: int = COLS,
+    max_opened: int = DEFAULT_MAX_OPENED,
+    solver_mode: SolverMode = SolverMode.components,
+    workers: Optional[int] = None,
+    seed: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Positions:
+    seeds = random.Random(seed)
+    chunks = []
+    for start in range(0, games, chunk_size):
+        chunks.append((seeds.getrandbits(64), min(chunk_size, games - start)))
+    arguments = (number_of_mines, rows, cols, max_opened, solver_mode)
+
+    positions: Positions = {}
+
+    def collect(chunk_positions: Positions) -> None:
+        for key, stats in chunk_positions.items():
+            if key not in positions:
+                positions[key] = stats
+            elif stats is not None:
+                positions[key].merge(stats)
+
+    if workers == 1:
+        for chunk_seed, chunk_games in chunks:
+            collect(play_chunk(chunk_seed, chunk_games, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(play_chunk, chunk_seed, chunk_games, *arguments)
+                for chunk_seed, chunk_games in chunks
+            ]
+            for future in futures:
+                collect(future.result())
+    return positions
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Build an opening book of early guesses from simulated games"
+    )
+    parser.add_argument("output", help="book file to write")
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="defaults to the CPU count"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--preset", choices=PRESETS, default="beginner")
+    parser.add_argument("--mines", type=int, help="overrides the preset")
+    parser.add_argument("--rows", type=int, help="overrides the preset")
+    parser.add_argument("--cols", type=int, help="overrides the preset")
+    parser.add_argument(
+        "--max-opened",
+        type=int,
+        default=DEFAULT_MAX_OPENED,
+        help="only book positions with at most this many opened slots",
+    )
+    parser.add_argument(
+        "--min-visits",
+        type=int,
+        default=DEFAULT_MIN_VISITS,
+        help="only book positions reached in at least this many games",
+    )
+    parser.add_argument(
+        "--solver-mode",
+        choices=[mode.name for mode in SolverMode],
+        default=SolverMode.components.name,
+        help="solver playing the certain moves between early guesses",
+    )
+    args = parser.parse_args(argv)
+    try:
+        number_of_mines, rows, cols = resolve_preset(
+            args.preset, args.mines, args.rows, args.cols
+        )
+    except ValueError as error:
+        parser.error(str(error))
+
+    positions = build_book(
+        games=args.games,
+        number_of_mines=number_of_mines,
+        rows=rows,
+        cols=cols,
+        max_opened=args.max_opened,
+        solver_mode=SolverMode[args.solver_mode],
+        workers=args.workers,
+        seed=args.seed,
+        chunk_size=args.chunk_size,
+    )
+    guesses = [stats for stats in positions.values() if stats is not None]
+    written = write_book(
+        args.output,
+        rows,
+        cols,
+        number_of_mines,
+        args.max_opened,
+        (
+            (key, stats.best(), stats.probability)
+            for key, stats in positions.items()
+            if stats is not None and stats.visits >= args.min_visits
+        ),
+    )
+    print(
+        f"positions {len(positions)} needing a guess {len(guesses)} "
+        f"booked {written} (visited {args.min_visits}+ times)"
+    )
+
+
+if __name__ == "__main__":
+    main()
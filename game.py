@@ -1,12 +1,52 @@
+from collections import deque
+from collections.abc import Sequence
 from enum import IntEnum
+from itertools import islice
+from random import Random
+from typing import Dict, List, Optional, Tuple
 
-from helper import generate_mines, get_surrounding_mines, get_surrounding_positions
-from models import Grid, Slot
+from bitboard import BITBOARD_MAX_CELLS, BitBoard, iter_bits
+from board import Board, decode_board_id, encode_board_id
+from helper import PerimeterGroup, generate_mines
+from models import Grid, SlotBase
+from phase_profiler import profiled
 
 NUMBER_OF_MINES = 10
 ROWS: int = 9
 COLS: int = 9
 
+# (mines, rows, cols) of the standard boards and of two stress-test sizes
+PRESETS: Dict[str, Tuple[int, int, int]] = {
+    "beginner": (NUMBER_OF_MINES, ROWS, COLS),
+    "intermediate": (40, 16, 16),
+    "expert": (99, 16, 30),
+    "large": (1600, 100, 100),
+    "huge": (160000, 1000, 1000),
+}
+
+
+def resolve_preset(
+    preset: str = "beginner",
+    number_of_mines: Optional[int] = None,
+    rows: Optional[int] = None,
+    cols: Optional[int] = None,
+) -> Tuple[int, int, int]:
+    # a preset's (mines, rows, cols), with any value given here overriding it
+    preset_mines, preset_rows, preset_cols = PRESETS[preset]
+    resolved = (
+        preset_mines if number_of_mines is None else number_of_mines,
+        preset_rows if rows is None else rows,
+        preset_cols if cols is None else cols,
+    )
+    number_of_mines, rows, cols = resolved
+    if rows < 1 or cols < 1:
+        raise ValueError(f"a {rows}x{cols} board has no slots")
+    if number_of_mines < 0:
+        raise ValueError(f"cannot place {number_of_mines} mines")
+    if number_of_mines >= rows * cols:
+        raise ValueError(f"{number_of_mines} mines do not fit a {rows}x{cols} board")
+    return resolved
+
 
 class GameState(IntEnum):
     UNSTARTED = 0
@@ -16,87 +56,259 @@ class GameState(IntEnum):
 
 
 class Game:
-    grid: Grid
+    board: Board
     state: GameState = GameState.UNSTARTED
     number_of_mines: int
     rows: int
     cols: int
+    unopened: int
+    rng: Optional[Random]
+    mines_placed: bool
 
     def __init__(
-        self, number_of_mines: int = NUMBER_OF_MINES, rows: int = ROWS, cols: int = COLS
+        self,
+        number_of_mines: int = NUMBER_OF_MINES,
+        rows: int = ROWS,
+        cols: int = COLS,
+        seed: Optional[int] = None,
+        rng: Optional[Random] = None,
+        safe_first_click: bool = False,
+        board: Optional[Board] = None,
     ):
         self.number_of_mines = number_of_mines
         self.rows = rows
         self.cols = cols
+        self.rng = rng if rng is not None or seed is None else Random(seed)
+        self.mines_placed = board is not None or not safe_first_click
+        if board is not None:
+            self.board = board
+        elif self.mines_placed:
+            mines = generate_mines(number_of_mines, rows, cols, rng=self.rng)
+            self.board = Board(rows, cols, mines)
+        else:
+            self.board = Board(rows, cols, ())
+        self.unopened = self.board.size
+        self._grid = None
+
+    @classmethod
+    def from_board_id(cls, board_id: str) -> "Game":
+        board = decode_board_id(board_id)
+        return cls(
+            number_of_mines=sum(board.mines),
+            rows=board.rows,
+            cols=board.cols,
+            board=board,
+        )
+
+    @classmethod
+    def from_observation(cls, number_of_mines: int, cells: Sequence[str]) -> "Game":
+        # a board seen from a player's side: one string per row, "." for an
+        # unopened slot, "F" for a flag and "0"-"8" for an opened number
+        rows = len(cells)
+        cols = len(cells[0]) if rows else 0
+        if not cols or any(len(line) != cols for line in cells):
+            raise ValueError("board rows must be non-empty and of equal length")
+        board = Board(rows, cols, ())
+        opened = []
+        for row, line in enumerate(cells):
+            for col, char in enumerate(line):
+                index = board.index(row, col)
+                if char == "F":
+                    board.set_flagged(index, True)
+                elif char in "012345678":
+                    board.counts[index] = int(char)
+                    opened.append(index)
+                elif char != ".":
+                    raise ValueError(f"unknown slot {char!r} at row {row} col {col}")
+        for index in opened:
+            board.open_cell(index)
 
-        grid: list[list[Slot]] = []
-        mines = generate_mines(number_of_mines, rows, cols)
-        for col in range(0, cols):
-            rows_list = []
-            for row in range(0, rows):
-                rows_list.append(Slot(row=row, col=col, has_mine=(row, col) in mines))
-            grid.append(rows_list)
+        game = cls(number_of_mines=number_of_mines, rows=rows, cols=cols, board=board)
+        game.unopened = board.size - len(opened)
+        if opened:
+            game.state = GameState.IN_PROGRESS
+        return game
 
-        for col in range(0, cols):
-            for row in range(0, rows):
-                slot = grid[col][row]
-                if not slot.has_mine:
-                    slot.number_of_mines_around = get_surrounding_mines(
-                        grid=grid, row=row, col=col
-                    )
+    def copy(self) -> "Game":
+        game = Game(
+            number_of_mines=self.number_of_mines,
+            rows=self.rows,
+            cols=self.cols,
+            board=self.board.copy(),
+        )
+        game.state = self.state
+        game.unopened = self.unopened
+        game.mines_placed = self.mines_placed
+        if self.rng is not None:
+            game.rng = Random()
+            game.rng.setstate(self.rng.getstate())
+        return game
 
-        self.grid = grid
+    def observation(self) -> List[str]:
+        # the inverse of from_observation, with "*" for opened mines
+        board = self.board
+        cells = []
+        for row in range(self.rows):
+            line = []
+            for col in range(self.cols):
+                index = board.index(row, col)
+                if board.flagged[index]:
+                    line.append("F")
+                elif board.opened[index]:
+                    line.append("*" if board.mines[index] else str(board.counts[index]))
+                else:
+                    line.append(".")
+            cells.append("".join(line))
+        return cells
+
+    @property
+    def board_id(self) -> str:
+        return encode_board_id(self.board)
+
+    @property
+    def grid(self) -> Grid:
+        # Slot views are only built for callers that still walk the grid
+        if self._grid is None:
+            self._grid = self.board.make_grid()
+        return self._grid
 
     def get_flag_total(self):
-        total = 0
-        for col in range(0, self.cols):
-            for row in range(0, self.rows):
-                total += 1 if self.grid[col][row].is_flagged else 0
-        return total
+        return self.board.flag_count
 
     def flag_slot(self, row: int, col: int):
-        slot = self.grid[col][row]
-        slot.is_flagged = not slot.is_flagged
+        index = self.board.index(row, col)
+        if self.board.opened[index]:
+            return
+        self.board.set_flagged(index, not self.board.flagged[index])
+
+    def get_slot(self, index: int) -> SlotBase:
+        row, col = self.board.position(index)
+        return self.grid[col][row]
+
+    @profiled("frontier")
+    def get_constrained_unopened_slots(self) -> Sequence[SlotBase]:
+        board = self.board
+        if board.size <= BITBOARD_MAX_CELLS:
+            indices = iter_bits(BitBoard(board).frontier())
+        else:
+            indices = sorted(board.frontier)
+        return [self.get_slot(index) for index in indices]
 
-    def open_slot(self, row: int, col: int):
+    @profiled("frontier")
+    def get_unconstrained_unopened_slots(
+        self, limit: Optional[int] = None
+    ) -> Sequence[SlotBase]:
+        # with a limit, only the first that many in index order
+        board = self.board
+        # the scan can stop once it has found every unconstrained cell
+        count = self.count_unconstrained_unopened_slots()
+        limit = count if limit is None else min(limit, count)
+        if board.size <= BITBOARD_MAX_CELLS:
+            indices = iter_bits(BitBoard(board).unconstrained())
+        else:
+            indices = board.iter_unconstrained()
+        return [self.get_slot(index) for index in islice(indices, limit)]
+
+    def count_unconstrained_unopened_slots(self) -> int:
+        return self.unopened - self.board.flag_count - len(self.board.frontier)
+
+    @profiled("frontier")
+    def get_constraint_slots(self) -> Sequence[SlotBase]:
+        return [self.get_slot(index) for index in sorted(self.board.constraint_cells)]
+
+    @profiled("grouping")
+    def get_perimeter_groups(self) -> Sequence[PerimeterGroup]:
+        board = self.board
+        components = board.get_components()
+        groups = [
+            PerimeterGroup(self.get_slot(index) for index in component)
+            for component in components
+        ]
+        group_of = {
+            index: group
+            for group, component in zip(groups, components)
+            for index in component
+        }
+        # every unknown neighbour of a constraint cell is in its component
+        for cell in sorted(board.constraint_cells):
+            group = group_of[board.get_unknown_neighbours(cell)[0]]
+            group.add_constraint(
+                self.get_slot(cell), board.count_flagged_neighbours(cell)
+            )
+        return groups
+
+    def open_slot(self, row: int, col: int) -> Sequence[int]:
+        # returns the indices of every slot this call opened
         if self.state == GameState.UNSTARTED:
             self.state = GameState.IN_PROGRESS
         elif self.state != GameState.IN_PROGRESS:
-            return
-        slot = self.grid[col][row]
-        if slot.is_flagged or slot.is_opened:
-            return
+            return []
+        board = self.board
+        index = board.index(row, col)
+        if board.flagged[index] or board.opened[index]:
+            return []
+        if not self.mines_placed:
+            self.place_mines_around(row=row, col=col)
 
-        slot.is_opened = True
-        if slot.has_mine:
+        board.open_cell(index)
+        self.unopened -= 1
+        if board.mines[index]:
             self.lose_game()
-            return
-        elif slot.number_of_mines_around == 0:
-            positions = get_surrounding_positions(grid=self.grid, row=row, col=col)
-            for pos in positions:
-                self.open_slot(pos[0], pos[1])
+            return [index]
+
+        opened_cells = [index]
+        opened, flagged, counts = board.opened, board.flagged, board.counts
+        queue = deque([index]) if counts[index] == 0 else ()
+        while queue:
+            current = queue.popleft()
+            for neighbour in board.neighbours[current]:
+                if opened[neighbour] or flagged[neighbour]:
+                    continue
+                board.open_cell(neighbour)
+                opened_cells.append(neighbour)
+                self.unopened -= 1
+                if counts[neighbour] == 0:
+                    queue.append(neighbour)
 
         self.check_win()
+        return opened_cells
 
-    def check_win(self):
-        remaining = 0
-        for row in self.grid:
-            for slot in row:
-                remaining += 0 if slot.is_opened else 1
+    def place_mines_around(self, row: int, col: int):
+        # keep the first click and, when there is room, its neighbours mine-free
+        excluded = [(row, col)]
+        if self.rows * self.cols - 9 >= self.number_of_mines:
+            excluded.extend(self.board.get_neighbour_positions(row, col))
+        self.board.place_mines(
+            generate_mines(
+                self.number_of_mines,
+                self.rows,
+                self.cols,
+                rng=self.rng,
+                excluded=excluded,
+            )
+        )
+        self.mines_placed = True
 
-        if remaining <= NUMBER_OF_MINES:
+    def check_win(self):
+        if self.unopened <= self.number_of_mines:
             self.win_game()
 
     def win_game(self):
-        for col in range(0, COLS):
-            for row in range(0, ROWS):
-                if not self.grid[col][row].is_opened:
-                    self.grid[col][row].is_flagged = True
+        board = self.board
+        for index in range(board.size):
+            if not board.opened[index] and not board.flagged[index]:
+                board.flagged[index] = 1
+                board.flag_count += 1
+        board.reset_position_hash()
+        board.clear_frontier()
         self.state = GameState.WON
 
     def lose_game(self):
-        for col in range(0, COLS):
-            for row in range(0, ROWS):
-                self.grid[col][row].is_opened = True
-                self.grid[col][row].is_flagged = False
+        board = self.board
+        board.opened[:] = b"\x01" * board.size
+        board.flagged[:] = bytes(board.size)
+        board.flag_count = 0
+        board.reset_position_hash()
+        board.clear_frontier()
+        self.unopened = 0
         self.state = GameState.LOST
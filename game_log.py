@@ -0,0 +1,218 @@
+import mmap
+import os
+import struct
+from collections.abc import Iterable, Iterator, Sequence
+from typing import BinaryIO, List, Optional
+
+from board import Board, decode_mine_bits, encode_mine_bits
+from game import Game, GameState
+from player_algo import MoveResult, MoveType
+
+# A log is MAGIC followed by one record per game:
+#   header: record size, rows, cols, mines, final state, move count
+#   mine layout: one bit per cell (see board.encode_mine_bits)
+#   moves: cell index (u16, or u32 on boards over 65535 cells), kind
+#   (move type | FLAG_BIT) and chosen mine probability * PROBABILITY_SCALE
+#   (NO_PROBABILITY for guesses made without one)
+MAGIC = b"MSLOG2"
+# logs from before rows, cols and mines were widened to 32 bits
+OLD_MAGICS = (b"MSLOG1",)
+HEADER = struct.Struct("<IIIIBI")
+SMALL_MOVE = struct.Struct("<HBH")
+LARGE_MOVE = struct.Struct("<IBH")
+FLAG_BIT = 0x04
+PROBABILITY_SCALE = 65534
+NO_PROBABILITY = 65535
+
+
+def _move_struct(rows: int, cols: int) -> struct.Struct:
+    return SMALL_MOVE if rows * cols <= 0xFFFF else LARGE_MOVE
+
+
+class LoggedMove:
+    index: int
+    move_type: MoveType
+    flag: bool
+    probability: Optional[float]
+
+    def __init__(
+        self, index: int, move_type: MoveType, flag: bool, probability: Optional[float]
+    ):
+        self.index = index
+        self.move_type = move_type
+        self.flag = flag
+        self.probability = probability
+
+
+class GameRecord:
+    rows: int
+    cols: int
+    number_of_mines: int
+    state: GameState
+    mine_bits: bytes
+    moves: Sequence[LoggedMove]
+
+    def __init__(
+        self,
+        rows: int,
+        cols: int,
+        number_of_mines: int,
+        state: GameState,
+        mine_bits: bytes,
+        moves: Sequence[LoggedMove],
+    ):
+        self.rows = rows
+        self.cols = cols
+        self.number_of_mines = number_of_mines
+        self.state = state
+        self.mine_bits = mine_bits
+        self.moves = moves
+
+    def board(self) -> Board:
+        return decode_mine_bits(self.rows, self.cols, self.mine_bits)
+
+    def new_game(self) -> Game:
+        return Game(
+            number_of_mines=self.number_of_mines,
+            rows=self.rows,
+            cols=self.cols,
+            board=self.board(),
+        )
+
+
+def encode_game(game: Game, moves: Iterable[MoveResult]) -> bytes:
+    board = game.board
+    move_struct = _move_struct(game.rows, game.cols)
+    packed = []
+    for move in moves:
+        for row, col, flag in move.actions:
+            probability = move.probabilities.get((row, col))
+            if probability is None and move.move_type == MoveType.simple:
+                probability = 1.0 if flag else 0.0
+            packed.append(
+                move_struct.pack(
+                    board.index(row, col),
+                    move.move_type | (FLAG_BIT if flag else 0),
+                    (
+                        NO_PROBABILITY
+                        if probability is None
+                        else round(min(max(probability, 0.0), 1.0) * PROBABILITY_SCALE)
+                    ),
+                )
+            )
+    mine_bits = encode_mine_bits(board)
+    size = HEADER.size + len(mine_bits) + move_struct.size * len(packed)
+    header = HEADER.pack(
+        size, game.rows, game.cols, game.number_of_mines, game.state, len(packed)
+    )
+    return b"".join((header, mine_bits, *packed))
+
+
+def decode_game(buffer: Sequence[int], offset: int = 0) -> GameRecord:
+    size, rows, cols, number_of_mines, state, move_count = HEADER.unpack_from(
+        buffer, offset
+    )
+    offset += HEADER.size
+    mine_bytes = (rows * cols + 7) // 8
+    mine_bits = bytes(buffer[offset : offset + mine_bytes])
+    offset += mine_bytes
+
+    moves = []
+    for index, kind, probability in _move_struct(rows, cols).iter_unpack(
+        buffer[offset : offset + size - HEADER.size - mine_bytes]
+    ):
+        moves.append(
+            LoggedMove(
+                index=index,
+                move_type=MoveType(kind & ~FLAG_BIT),
+                flag=bool(kind & FLAG_BIT),
+                probability=(
+                    None
+                    if probability == NO_PROBABILITY
+                    else probability / PROBABILITY_SCALE
+                ),
+            )
+        )
+    return GameRecord(rows, cols, number_of_mines, GameState(state), mine_bits, moves)
+
+
+class GameLogWriter:
+    """Appends encoded games to a log file, writing MAGIC to new files"""
+
+    def __init__(self, path: str):
+        self._file: BinaryIO = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+            return
+        with open(path, "rb") as log_file:
+            magic = log_file.read(len(MAGIC))
+        if magic != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a game log in the current format")
+
+    def write(self, records: bytes) -> None:
+        self._file.write(records)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "GameLogWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class GameLog:
+    """Read-only, memory-mapped view of a log. Games are decoded only when
+    they are read; offsets() walks just the record headers."""
+
+    def __init__(self, path: str):
+        self._mmap: Optional[mmap.mmap] = None
+        with open(path, "rb") as log_file:
+            if os.fstat(log_file.fileno()).st_size <= len(MAGIC):
+                self._buffer = memoryview(b"")
+            else:
+                self._mmap = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._buffer = memoryview(self._mmap)
+        if len(self._buffer) and self._buffer[: len(MAGIC)] != MAGIC:
+            magic = bytes(self._buffer[: len(MAGIC)])
+            self.close()
+            if magic in OLD_MAGICS:
+                raise ValueError(f"{path} is a game log in an older format")
+            raise ValueError(f"{path} is not a game log")
+        self._offsets: Optional[List[int]] = None
+
+    def offsets(self) -> List[int]:
+        if self._offsets is None:
+            offsets = []
+            offset = len(MAGIC) if len(self._buffer) else 0
+            while offset + HEADER.size <= len(self._buffer):
+                size = HEADER.unpack_from(self._buffer, offset)[0]
+                if offset + size > len(self._buffer):
+                    break  # a record cut short by an interrupted run
+                offsets.append(offset)
+                offset += size
+            self._offsets = offsets
+        return self._offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets())
+
+    def __getitem__(self, number: int) -> GameRecord:
+        return decode_game(self._buffer, self.offsets()[number])
+
+    def __iter__(self) -> Iterator[GameRecord]:
+        for offset in self.offsets():
+            yield decode_game(self._buffer, offset)
+
+    def close(self) -> None:
+        self._buffer.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def __enter__(self) -> "GameLog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
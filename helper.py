@@ -1,261 +1,624 @@
-from collections import defaultdict, deque
-from collections.abc import Mapping, Sequence, Set
-from random import randint
-from typing import Dict, Tuple
+import random
+from collections.abc import Iterable, Mapping, Sequence, Set
+from concurrent.futures import Executor
+from functools import lru_cache, partial
+from itertools import count
+from random import Random
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
 
 from constraint import Problem
 
-from models import Grid, Slot
+from board import MAX_TABLE_CELLS, Board, SlotView, get_neighbour_table
+from models import Grid, SlotBase
+from pattern_cache import PatternCache, PatternKey, canonical_pattern
+from phase_profiler import note, profiled
+from solver import (
+    DEADLINE_CHECK_STEPS,
+    Constraint,
+    SolverTimeout,
+    count_configurations,
+    sample_configurations,
+    solve_components,
+)
+
+NeighbourPositions = Sequence[Tuple[int, int]]
+# smaller groups solve faster than a round trip to a pool worker
+PARALLEL_GROUP_SIZE = 24
 
 
 def generate_mines(
-    number_of_mines: int, rows: int, columns: int
-) -> Sequence[Tuple[int, int]]:
+    number_of_mines: int,
+    rows: int,
+    columns: int,
+    rng: Optional[Random] = None,
+    excluded: Iterable[Tuple[int, int]] = (),
+) -> Set[Tuple[int, int]]:
+    # sample cell indices without replacement, skipping over excluded cells
+    skipped = sorted({col * rows + row for row, col in excluded})
+    available = rows * columns - len(skipped)
+    if number_of_mines > available:
+        raise ValueError(
+            f"cannot place {number_of_mines} mines in {available} free slots"
+        )
+
     mines = set()
-    # TODO: make more efficient
-    while len(mines) < number_of_mines:
-        x = randint(0, rows - 1)
-        y = randint(0, columns - 1)
-        mines.add((x, y))
+    for index in (rng or random).sample(range(available), number_of_mines):
+        for excluded_index in skipped:
+            if index >= excluded_index:
+                index += 1
+        col, row = divmod(index, rows)
+        mines.add((row, col))
     return mines
 
 
-def get_surrounding_positions(
-    grid: Grid, row: int, col: int
-) -> Sequence[Tuple[int, int]]:
-    positions = []
-    max_col = len(grid) - 1
-    max_row = len(grid[0]) - 1
+@lru_cache(maxsize=8)
+def get_neighbour_positions(rows: int, cols: int) -> Sequence[NeighbourPositions]:
+    # (row, col) of every neighbour, per Board index; built once per board size
+    # and shared by every game of that size
+    return tuple(
+        tuple(divmod(neighbour, rows)[::-1] for neighbour in neighbours)
+        for neighbours in get_neighbour_table(rows, cols)
+    )
+
+
+def get_surrounding_positions(grid: Grid, row: int, col: int) -> NeighbourPositions:
+    rows, cols = len(grid[0]), len(grid)
+    if rows * cols > MAX_TABLE_CELLS:
+        neighbours = get_neighbour_table(rows, cols)[col * rows + row]
+        return [(neighbour % rows, neighbour // rows) for neighbour in neighbours]
+    return get_neighbour_positions(rows, cols)[col * rows + row]
 
-    for dt_y in range(-1, 2):
-        for dt_x in range(-1, 2):
-            x = row + dt_x
-            y = col + dt_y
-            if (
-                (dt_x == 0 and dt_y == 0)
-                or (x < 0 or y < 0)
-                or (x > max_row or y > max_col)
-            ):
-                continue
 
-            positions.append((x, y))
-    return positions
+def _board_of(grid: Grid) -> Optional[Board]:
+    # grids from Board.make_grid are views of a Board, whose arrays are read
+    # directly instead of through a slot per neighbour
+    slot = grid[0][0]
+    return slot.board if isinstance(slot, SlotView) else None
 
 
 def get_surrounding_mines(grid: Grid, row: int, col: int) -> int:
+    board = _board_of(grid)
+    if board is not None:
+        mines = board.mines
+        return sum(mines[n] for n in board.neighbours[board.index(row, col)])
     positions = get_surrounding_positions(grid=grid, row=row, col=col)
-    return sum(1 for pos in positions if grid[pos[1]][pos[0]].has_mine)
+    return sum(1 for r, c in positions if grid[c][r].has_mine)
 
 
 def get_number_of_surrounding_flags(grid: Grid, row: int, col: int) -> int:
+    board = _board_of(grid)
+    if board is not None:
+        return board.count_flagged_neighbours(board.index(row, col))
     positions = get_surrounding_positions(grid=grid, row=row, col=col)
-    return sum(1 for pos in positions if grid[pos[1]][pos[0]].is_flagged)
+    return sum(1 for r, c in positions if grid[c][r].is_flagged)
 
 
 def get_number_of_surrounding_unopened_slots(grid: Grid, row: int, col: int) -> int:
-    positions = get_surrounding_positions(grid=grid, row=row, col=col)
-    return sum(1 for pos in positions if not grid[pos[1]][pos[0]].is_opened)
+    return count_surrounding(grid=grid, row=row, col=col)[1]
 
 
-def get_surrounding_slots(grid: Grid, row: int, col: int) -> Sequence[Slot]:
+def count_surrounding(grid: Grid, row: int, col: int) -> Tuple[int, int, int]:
+    # (flagged, unopened, opened) neighbours in one pass; unopened includes
+    # flags, as in get_number_of_surrounding_unopened_slots
+    board = _board_of(grid)
+    if board is not None:
+        return board.count_neighbours(board.index(row, col))
+    flags = opened = 0
     positions = get_surrounding_positions(grid=grid, row=row, col=col)
-    return [grid[pos[1]][pos[0]] for pos in positions]
+    for r, c in positions:
+        slot = grid[c][r]
+        if slot.is_opened:
+            opened += 1
+        elif slot.is_flagged:
+            flags += 1
+    return flags, len(positions) - opened, opened
 
 
-def get_unopened_slots(grid: Grid) -> Sequence[Slot]:
-    return [
-        grid[col][row]
-        for col in range(0, len(grid))
-        for row in range(0, len(grid[0]))
-        if not grid[col][row].is_opened and not grid[col][row].is_flagged
-    ]
+def get_surrounding_slots(grid: Grid, row: int, col: int) -> Sequence[SlotBase]:
+    positions = get_surrounding_positions(grid=grid, row=row, col=col)
+    return [grid[c][r] for r, c in positions]
 
 
-def get_opened_constraint_slots_near_group(grid: Grid, group: Set[Slot]) -> Set[Slot]:
+def get_opened_constraint_slots_near_group(
+    grid: Grid, group: Set[SlotBase]
+) -> Set[SlotBase]:
+    # opened numbers can only constrain the group from next to it
     slots = set()
-    for col in range(len(grid)):
-        for row in range(len(grid[0])):
-            slot = grid[col][row]
-            if (
-                slot.is_opened
-                and slot.number_of_mines_around > 0
-                and (
-                    set(get_surrounding_slots(grid=grid, row=slot.row, col=slot.col))
-                    & group
-                )
-            ):
-                slots.add(slot)
+    for slot in group:
+        for row, col in get_surrounding_positions(
+            grid=grid, row=slot.row, col=slot.col
+        ):
+            neighbor = grid[col][row]
+            if neighbor.is_opened and neighbor.number_of_mines_around > 0:
+                slots.add(neighbor)
     return slots
 
 
 def is_slot_unconstrained(grid: Grid, row: int, col: int):
-    neighbors = get_surrounding_slots(grid, row, col)
-    return all(not n.is_opened for n in neighbors)
+    positions = get_surrounding_positions(grid=grid, row=row, col=col)
+    return not any(grid[c][r].is_opened for r, c in positions)
 
 
-def get_constrained_unopened_slots(grid: Grid) -> Sequence[Slot]:
+@profiled("frontier")
+def get_constrained_unopened_slots(grid: Grid) -> Sequence[SlotBase]:
     return [
         grid[col][row]
         for col in range(0, len(grid))
         for row in range(0, len(grid[0]))
         if not grid[col][row].is_opened
         and not grid[col][row].is_flagged
-        and any(
-            slot.is_opened
-            for slot in get_surrounding_slots(grid=grid, row=row, col=col)
-        )
+        and not is_slot_unconstrained(grid=grid, row=row, col=col)
     ]
 
 
-def check_config(grid: Grid, flagged_slots: Set[Slot]) -> bool:
+def check_config(grid: Grid, flagged_slots: Set[SlotBase]) -> bool:
+    # no opened number next to the (already flagged) slots has more flags
+    # around it than its count
     for slot in flagged_slots:
-        surrounding_slots = get_surrounding_slots(grid=grid, row=slot.row, col=slot.col)
-        for ss in surrounding_slots:
+        for row, col in get_surrounding_positions(
+            grid=grid, row=slot.row, col=slot.col
+        ):
+            ss = grid[col][row]
             if (
                 ss.is_opened
                 and ss.number_of_mines_around
-                < get_number_of_surrounding_flags(grid=grid, row=ss.row, col=ss.col)
+                < get_number_of_surrounding_flags(grid=grid, row=row, col=col)
             ):
                 return False
 
     return True
 
 
-def flag_slots(slots: Set[Slot]) -> None:
+def flag_slots(slots: Set[SlotBase]) -> None:
     for slot in slots:
         slot.is_flagged = True
 
 
-def unflag_slots(slots: Set[Slot]) -> None:
+def unflag_slots(slots: Set[SlotBase]) -> None:
     for slot in slots:
         slot.is_flagged = False
 
 
-def risk_score_heuristic(grid: Grid, slot: Slot) -> Tuple[int, int]:
-    surrounding = get_surrounding_slots(grid, slot.row, slot.col)
+class PerimeterGroup(list):
+    """Frontier slots that share constraints, plus the opened numbers
+    constraining them, so solvers need not look for those on the grid"""
 
-    number_of_constraints = sum(1 for n in surrounding if n.is_opened)
-    number_adjacent = sum(
-        1 for s in surrounding if s.is_opened and s.number_of_mines_around > 0
-    )
-    unopened_adjacent = sum(1 for s in surrounding if not s.is_opened)
+    # opened numbered slots next to the group
+    constraint_slots: List[SlotBase]
+    # flags next to each constraint slot, subtracted from its number
+    flag_offsets: List[int]
 
-    total_neighbors = len(surrounding)
-    risk_density = (number_adjacent + unopened_adjacent) / total_neighbors
-    # less contraints is better than lower risk
-    return (number_of_constraints, int(risk_density * 100))
+    def __init__(self, slots: Iterable[SlotBase] = ()):
+        super().__init__(slots)
+        self.constraint_slots = []
+        self.flag_offsets = []
 
+    def add_constraint(self, slot: SlotBase, flags: int) -> None:
+        self.constraint_slots.append(slot)
+        self.flag_offsets.append(flags)
 
-def get_perimeter_groups(
-    grid: Grid, perimeter_slots: Sequence[Slot]
-) -> Sequence[Sequence[Slot]]:
-    slot_neighbors = defaultdict(set)
-    for col in range(len(grid)):
-        for row in range(len(grid[0])):
-            slot = grid[col][row]
-            if slot.is_opened and slot.number_of_mines_around > 0:
-                neighboring_slots = get_surrounding_slots(grid=grid, row=row, col=col)
-                for neighbor in neighboring_slots:
-                    if neighbor in perimeter_slots:
-                        slot_neighbors[(row, col)].add(neighbor)
-
-    adjacency = defaultdict(set)
-    for neighbors in slot_neighbors.values():
-        neighbors_list = list(neighbors)
-        for i in range(len(neighbors_list)):
-            for j in range(i + 1, len(neighbors_list)):
-                adjacency[neighbors_list[i]].add(neighbors_list[j])
-                adjacency[neighbors_list[j]].add(neighbors_list[i])
-
-    visited = set()
-    groups = []
-    for slot in perimeter_slots:
-        if slot in visited:
-            continue
 
-        group = []
-        queue = deque([slot])
-        visited.add(slot)
-        while queue:
-            current = queue.popleft()
-            group.append(current)
-            for adjacent_slot in adjacency[current]:
-                if adjacent_slot not in visited:
-                    queue.append(adjacent_slot)
-                    visited.add(adjacent_slot)
-        groups.append(group)
-    return groups
-
-
-def run_EPP_on(grid: Grid, grouped_slots: Sequence[Slot]) -> Mapping[int, float]:
-    bits_length = len(grouped_slots)
-    max_configs = 2**bits_length
-    successful_configs = []
-    for bits in range(max_configs):
-        config_combinations = [i for i in range(bits_length) if (bits >> i) & 1]
-        to_flag = {grouped_slots[i] for i in config_combinations}
-        flag_slots(slots=to_flag)
-        if check_config(grid=grid, flagged_slots=to_flag):
-            successful_configs.append(config_combinations)
-        unflag_slots(slots=to_flag)
-
-    probabilities = {}
-    for i in range(0, bits_length):
-        probabilities[grouped_slots[i]] = sum(
-            1.0 for config in successful_configs if i in config
-        ) / len(successful_configs)
-    return probabilities
+@profiled("grouping")
+def get_perimeter_groups(
+    grid: Grid, perimeter_slots: Sequence[SlotBase]
+) -> Sequence[PerimeterGroup]:
+    # union-find over the perimeter: slots next to the same opened number
+    # are joined, once per number rather than once per pair
+    members = {(slot.row, slot.col): i for i, slot in enumerate(perimeter_slots)}
+    parents = list(range(len(perimeter_slots)))
+
+    def find(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    # opened number position -> first perimeter slot seen next to it
+    constraint_members: Dict[Tuple[int, int], int] = {}
+    for i, slot in enumerate(perimeter_slots):
+        for row, col in get_surrounding_positions(
+            grid=grid, row=slot.row, col=slot.col
+        ):
+            neighbor = grid[col][row]
+            if not neighbor.is_opened or neighbor.number_of_mines_around == 0:
+                continue
+            first = constraint_members.setdefault((row, col), i)
+            root, other = find(first), find(i)
+            if root != other:
+                parents[other] = root
+
+    groups: Dict[int, PerimeterGroup] = {}
+    for i, slot in enumerate(perimeter_slots):
+        groups.setdefault(find(i), PerimeterGroup()).append(slot)
+    for (row, col), first in constraint_members.items():
+        groups[find(first)].add_constraint(
+            grid[col][row], get_number_of_surrounding_flags(grid=grid, row=row, col=col)
+        )
+    return list(groups.values())
+
+
+def _cache_lookup(
+    grouped_slots: Sequence[SlotBase],
+    constraints: Sequence[Constraint],
+    cache: Optional[PatternCache],
+) -> Tuple[Optional[PatternKey], Sequence[int], Optional[Tuple[float, ...]]]:
+    # (key, canonical order, cached probabilities); no key when not cacheable
+    if cache is None or not cache.accepts(len(grouped_slots)):
+        return None, (), None
+    key, order = canonical_pattern(
+        [(slot.row, slot.col) for slot in grouped_slots], constraints
+    )
+    cached = cache.get(key)
+    note(cache_hits=cached is not None, cache_misses=cached is None)
+    return key, order, cached
+
+
+def _cache_store(
+    cache: PatternCache,
+    key: PatternKey,
+    order: Sequence[int],
+    probabilities: Optional[Sequence[float]],
+) -> Tuple[float, ...]:
+    cached = ()
+    if probabilities:
+        canonical = [0.0] * len(order)
+        for variable, probability in enumerate(probabilities):
+            canonical[order[variable]] = probability
+        cached = tuple(canonical)
+    cache.put(key, cached)
+    return cached
+
+
+def _from_cached(
+    grouped_slots: Sequence[SlotBase], order: Sequence[int], cached: Tuple[float, ...]
+) -> Mapping[SlotBase, float]:
+    if not cached:
+        return {}
+    return {slot: cached[order[i]] for i, slot in enumerate(grouped_slots)}
+
+
+def _solve_cached(
+    grouped_slots: Sequence[SlotBase],
+    constraints: Sequence[Constraint],
+    cache: Optional[PatternCache],
+    solve: Callable[
+        [int, Sequence[Constraint], Optional[float]], Optional[Sequence[float]]
+    ],
+    deadline: Optional[float] = None,
+) -> Mapping[SlotBase, float]:
+    key, order, cached = _cache_lookup(grouped_slots, constraints, cache)
+    if key is None:
+        probabilities = solve(len(grouped_slots), constraints, deadline)
+        return dict(zip(grouped_slots, probabilities)) if probabilities else {}
+    if cached is None:
+        probabilities = solve(len(grouped_slots), constraints, deadline)
+        cached = _cache_store(cache, key, order, probabilities)
+    return _from_cached(grouped_slots, order, cached)
+
+
+def _solve_by_enumeration(
+    variable_count: int,
+    constraints: Sequence[Constraint],
+    deadline: Optional[float] = None,
+) -> Optional[Sequence[float]]:
+    counts = count_configurations(
+        variable_count=variable_count, constraints=constraints, deadline=deadline
+    )
+    note(solutions=counts.total())
+    return counts.probabilities() if counts.total() else None
 
 
-def run_CSP_on(grid: Grid, grouped_slots: Sequence[Slot]) -> Mapping[Slot, float]:
+def _solve_with_problem(
+    variable_count: int,
+    constraints: Sequence[Constraint],
+    deadline: Optional[float] = None,
+) -> Optional[Sequence[float]]:
     problem = Problem()
-    variable_map = {}  # map position to var name
-    reverse_map = {}  # map var name to slot
-    for slot in grouped_slots:
-        var_name = str(slot)
-        variable_map[(slot.row, slot.col)] = var_name
-        reverse_map[var_name] = slot
-        problem.addVariable(var_name, [0, 1])
+    for i in range(variable_count):
+        problem.addVariable(i, [0, 1])
+    if deadline is None:
+        for variables, total_mines in constraints:
+            problem.addConstraint(
+                lambda *vals, total=total_mines: sum(vals) == total, variables
+            )
+    else:
+        # the search can run long without yielding a solution, so the
+        # constraints themselves watch the clock, every few hundred checks
+        checks = count(1)
+
+        def within_deadline(*vals, total):
+            if not next(checks) & DEADLINE_CHECK_STEPS and perf_counter() > deadline:
+                raise SolverTimeout()
+            return sum(vals) == total
+
+        for variables, total_mines in constraints:
+            problem.addConstraint(
+                partial(within_deadline, total=total_mines), variables
+            )
+
+    solutions = []
+    for solution in problem.getSolutionIter():
+        solutions.append(solution)
+        if deadline is not None and perf_counter() > deadline:
+            raise SolverTimeout()
+    note(solutions=len(solutions))
+    if not solutions:
+        return None
+    return [
+        sum(1 for s in solutions if s[i] == 1) / len(solutions)
+        for i in range(variable_count)
+    ]
 
-    for opened_slot in get_opened_constraint_slots_near_group(
-        grid=grid, group=set(grouped_slots)
-    ):
-        unflagged_vars = []
+
+@profiled("epp")
+def run_EPP_on(
+    grid: Grid,
+    grouped_slots: Sequence[SlotBase],
+    constraint_slots: Optional[Iterable[SlotBase]] = None,
+    cache: Optional[PatternCache] = None,
+    deadline: Optional[float] = None,
+) -> Mapping[SlotBase, float]:
+    # enumerate placements on an index-based copy of the constraints, pruning
+    # as soon as a number is over- or under-satisfied, without touching grid
+    constraints = build_constraint_system(
+        grid=grid, slots=grouped_slots, constraint_slots=constraint_slots
+    )
+    note(frontier=len(grouped_slots))
+    return _solve_cached(
+        grouped_slots, constraints, cache, _solve_by_enumeration, deadline
+    )
+
+
+@profiled("csp")
+def run_CSP_on(
+    grid: Grid,
+    grouped_slots: Sequence[SlotBase],
+    constraint_slots: Optional[Iterable[SlotBase]] = None,
+    cache: Optional[PatternCache] = None,
+    deadline: Optional[float] = None,
+) -> Mapping[SlotBase, float]:
+    constraints = build_constraint_system(
+        grid=grid, slots=grouped_slots, constraint_slots=constraint_slots
+    )
+    note(frontier=len(grouped_slots))
+    return _solve_cached(
+        grouped_slots, constraints, cache, _solve_with_problem, deadline
+    )
+
+
+def solve_constraint_system(
+    variable_count: int,
+    constraints: Sequence[Constraint],
+    use_problem: bool,
+    budget: Optional[float] = None,
+) -> Optional[Sequence[float]]:
+    # entry point for pool workers: only the constraint system crosses the
+    # process boundary, and the time left is sent instead of a deadline since
+    # perf_counter is not comparable between processes
+    deadline = None if budget is None else perf_counter() + budget
+    solve = _solve_with_problem if use_problem else _solve_by_enumeration
+    return solve(variable_count, constraints, deadline)
+
+
+def solve_groups(
+    grid: Grid,
+    groups: Sequence[Sequence[SlotBase]],
+    cache: Optional[PatternCache] = None,
+    max_csp_group_size: int = 16,
+    deadline: Optional[float] = None,
+    executor: Optional[Executor] = None,
+    parallel_group_size: int = PARALLEL_GROUP_SIZE,
+) -> List[Optional[Mapping[SlotBase, float]]]:
+    """Solve each group as run_CSP_on or run_EPP_on would, in group order.
+    With an executor, uncached groups of at least parallel_group_size slots
+    are solved in it while the smaller ones are solved here. A group's entry
+    is None when its solve ran past the deadline."""
+    results: List[Optional[Mapping[SlotBase, float]]] = [None] * len(groups)
+    pending = []
+    for i, group in enumerate(groups):
+        if executor is None or len(group) < parallel_group_size:
+            continue
+        constraints = build_constraint_system(grid=grid, slots=group)
+        key, order, cached = _cache_lookup(group, constraints, cache)
+        if cached is not None:
+            results[i] = _from_cached(group, order, cached)
+            continue
+        budget = None if deadline is None else max(deadline - perf_counter(), 0.0)
+        future = executor.submit(
+            solve_constraint_system,
+            len(group),
+            constraints,
+            len(group) <= max_csp_group_size,
+            budget,
+        )
+        pending.append((i, key, order, future))
+
+    submitted = {i for i, _, _, _ in pending}
+    for i, group in enumerate(groups):
+        if i in submitted or results[i] is not None:
+            continue
+        solve = run_CSP_on if len(group) <= max_csp_group_size else run_EPP_on
+        try:
+            results[i] = solve(
+                grid=grid, grouped_slots=group, cache=cache, deadline=deadline
+            )
+        except SolverTimeout:
+            pass
+
+    for i, key, order, future in pending:
+        try:
+            probabilities = future.result()
+        except SolverTimeout:
+            continue
+        if key is None:
+            results[i] = dict(zip(groups[i], probabilities)) if probabilities else {}
+        else:
+            cached = _cache_store(cache, key, order, probabilities)
+            results[i] = _from_cached(groups[i], order, cached)
+    return results
+
+
+def build_constraint_system(
+    grid: Grid,
+    slots: Sequence[SlotBase],
+    constraint_slots: Optional[Iterable[SlotBase]] = None,
+) -> Sequence[Constraint]:
+    variable_map = {(slot.row, slot.col): i for i, slot in enumerate(slots)}
+    if constraint_slots is None and isinstance(slots, PerimeterGroup):
+        return _build_group_constraints(grid, slots, variable_map)
+    if constraint_slots is None:
+        constraint_slots = get_opened_constraint_slots_near_group(
+            grid=grid, group=set(slots)
+        )
+
+    constraints = []
+    for opened_slot in constraint_slots:
+        variables = []
         flagged_count = 0
-        neighbors = get_surrounding_slots(
+        for key in get_surrounding_positions(
             grid=grid, row=opened_slot.row, col=opened_slot.col
-        )
-        for neighbor in neighbors:
+        ):
+            neighbor = grid[key[1]][key[0]]
             if neighbor.is_flagged:
                 flagged_count += 1
-            elif not neighbor.is_opened:
-                key = (neighbor.row, neighbor.col)
-                if key in variable_map:
-                    unflagged_vars.append(variable_map[key])
-        if not unflagged_vars:
+            elif not neighbor.is_opened and key in variable_map:
+                variables.append(variable_map[key])
+        if not variables:
             continue
 
         total_mines = opened_slot.number_of_mines_around - flagged_count
-        problem.addConstraint(
-            lambda *vals, total=total_mines: sum(vals) == total, unflagged_vars
+        constraints.append((tuple(variables), total_mines))
+    return constraints
+
+
+def _build_group_constraints(
+    grid: Grid, group: PerimeterGroup, variable_map: Mapping[Tuple[int, int], int]
+) -> Sequence[Constraint]:
+    # the group's slots are its unknowns and its flags are already counted
+    constraints = []
+    for opened_slot, flags in zip(group.constraint_slots, group.flag_offsets):
+        variables = tuple(
+            variable_map[key]
+            for key in get_surrounding_positions(
+                grid=grid, row=opened_slot.row, col=opened_slot.col
+            )
+            if key in variable_map
         )
+        if variables:
+            constraints.append((variables, opened_slot.number_of_mines_around - flags))
+    return constraints
 
-    solutions = problem.getSolutions()
-    probabilities = {}
-    if not solutions:
-        return probabilities
 
-    for var_name, slot in reverse_map.items():
-        probabilities[slot] = sum(1 for s in solutions if s[var_name] == 1) / len(
-            solutions
-        )
+@profiled("global_csp")
+def run_global_CSP_on(
+    grid: Grid,
+    constrained_slots: Sequence[SlotBase],
+    remaining_mines: int,
+    constraint_slots: Optional[Iterable[SlotBase]] = None,
+    deadline: Optional[float] = None,
+) -> Mapping[SlotBase, float]:
+    constraints = build_constraint_system(
+        grid=grid, slots=constrained_slots, constraint_slots=constraint_slots
+    )
+    note(frontier=len(constrained_slots))
+    counts = count_configurations(
+        variable_count=len(constrained_slots),
+        constraints=constraints,
+        max_mines=remaining_mines,
+        deadline=deadline,
+    )
+    note(solutions=counts.total())
+    if not counts.total():
+        return {}
 
+    return dict(zip(constrained_slots, counts.probabilities()))
+
+
+@profiled("component_csp")
+def run_component_CSP_on(
+    grid: Grid,
+    constrained_slots: Sequence[SlotBase],
+    unconstrained_slots: Sequence[SlotBase],
+    remaining_mines: int,
+    constraint_slots: Optional[Iterable[SlotBase]] = None,
+    deadline: Optional[float] = None,
+    interior_count: Optional[int] = None,
+) -> Mapping[SlotBase, float]:
+    # interior_count, when given, is the number of unconstrained slots on the
+    # board and unconstrained_slots only the ones to return probabilities for
+    if interior_count is None:
+        interior_count = len(unconstrained_slots)
+    constraints = build_constraint_system(
+        grid=grid, slots=constrained_slots, constraint_slots=constraint_slots
+    )
+    note(frontier=len(constrained_slots), interior=interior_count)
+    solved = solve_components(
+        variable_count=len(constrained_slots),
+        constraints=constraints,
+        interior_count=interior_count,
+        remaining_mines=remaining_mines,
+        deadline=deadline,
+    )
+    if solved is None:
+        return {}
+
+    frontier_probabilities, interior_probability = solved
+    probabilities = dict(zip(constrained_slots, frontier_probabilities))
+    for slot in unconstrained_slots:
+        probabilities[slot] = interior_probability
     return probabilities
 
 
-def run_global_CSP_on(
-    grid: Grid, constrained_slots: Sequence[Slot], remaining_mines: int
-) -> Mapping[Slot, float]:
+@profiled("sampling")
+def estimate_probabilities_on(
+    grid: Grid,
+    constrained_slots: Sequence[SlotBase],
+    deadline: float,
+    unconstrained_slots: Sequence[SlotBase] = (),
+    remaining_mines: Optional[int] = None,
+    constraint_slots: Optional[Iterable[SlotBase]] = None,
+    rng: Optional[Random] = None,
+    interior_count: Optional[int] = None,
+) -> Mapping[SlotBase, Tuple[float, float]]:
+    # sampled (probability, confidence half-width) for when exact solving
+    # does not fit in the time budget; interior slots are only estimated when
+    # remaining_mines is given. interior_count is as in run_component_CSP_on
+    if interior_count is None:
+        interior_count = len(unconstrained_slots)
+    constraints = build_constraint_system(
+        grid=grid, slots=constrained_slots, constraint_slots=constraint_slots
+    )
+    sampled = sample_configurations(
+        variable_count=len(constrained_slots),
+        constraints=constraints,
+        deadline=deadline,
+        interior_count=interior_count,
+        remaining_mines=remaining_mines,
+        rng=rng,
+    )
+    note(frontier=len(constrained_slots), samples=sampled.samples if sampled else 0)
+    if sampled is None:
+        return {}
+
+    estimates = {
+        slot: (probability, half_width)
+        for slot, probability, half_width in zip(
+            constrained_slots, sampled.probabilities, sampled.half_widths
+        )
+    }
+    if remaining_mines is not None:
+        for slot in unconstrained_slots:
+            estimates[slot] = (
+                sampled.interior_probability,
+                sampled.interior_half_width,
+            )
+    return estimates
+
+
+def run_global_CSP_with_problem_on(
+    grid: Grid, constrained_slots: Sequence[SlotBase], remaining_mines: int
+) -> Mapping[SlotBase, float]:
     problem = Problem()
     variable_map = {}  # map position to var name
     reverse_map = {}  # map var name to index (in constrained_slots)
@@ -297,7 +660,7 @@ def run_global_CSP_on(
     if not solutions or len(solutions) < 10:
         return {}
 
-    probabilities: Dict[Slot, float] = {slot: 0 for slot in constrained_slots}
+    probabilities: Dict[SlotBase, float] = {slot: 0 for slot in constrained_slots}
 
     for sol in solutions:
         for var_name, val in sol.items():
@@ -1,21 +1,108 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import pygame
 
-from game import Game, GameState
-from ui import draw_board, load_images, lose_screen, win_screen
+from bot_worker import BotWorker
+from game import PRESETS, Game, GameState, resolve_preset
+from opening_book import OpeningBook
+from player_algo import PlayerAlgo, SolverMode
+from ui import BoardRenderer
+
+FPS = 60
+# moves per second the bot can be played back at
+SPEEDS = (1, 2, 5, 10, 30, 60)
+
+parser = argparse.ArgumentParser(description="Play Minesweeper, or watch the bot")
+parser.add_argument(
+    "--bot",
+    action="store_true",
+    help="let PlayerAlgo play: space pauses, right arrow steps, "
+    "up/down change speed, o toggles probabilities, n starts a new game",
+)
+parser.add_argument(
+    "--solver-mode",
+    choices=[mode.name for mode in SolverMode],
+    default=SolverMode.global_csp.name,
+)
+parser.add_argument("--speed", type=int, choices=SPEEDS, default=5)
+parser.add_argument("--preset", choices=PRESETS, default="beginner")
+parser.add_argument("--mines", type=int, help="overrides the preset")
+parser.add_argument("--rows", type=int, help="overrides the preset")
+parser.add_argument("--cols", type=int, help="overrides the preset")
+parser.add_argument("--opening-book", help="a book written by build_book.py")
+parser.add_argument(
+    "--group-workers",
+    type=int,
+    default=0,
+    help="processes solving large frontier groups in local_csp mode",
+)
+args = parser.parse_args()
+try:
+    board_size = resolve_preset(args.preset, args.mines, args.rows, args.cols)
+except ValueError as error:
+    parser.error(str(error))
+
+
+def new_game() -> Game:
+    number_of_mines, rows, cols = board_size
+    return Game(number_of_mines=number_of_mines, rows=rows, cols=cols)
+
 
 # pygame setup
 pygame.init()
 pygame.display.set_caption("Minesweeper")
 screen = pygame.display.set_mode((1280, 720))
-game = Game()
-collision_grid = []
+clock = pygame.time.Clock()
+game = new_game()
+renderer = BoardRenderer(screen)
 running = True
 
 holding = False
 hold_start_time = 0
 HOLD_THRESHOLD = 500  # ms → 500ms = 0.5 seconds → adjust as needed
 
-load_images(game.cols)
+group_pool = (
+    ProcessPoolExecutor(max_workers=args.group_workers)
+    if args.bot and args.group_workers
+    else None
+)
+bot = (
+    BotWorker(
+        PlayerAlgo(
+            solver_mode=SolverMode[args.solver_mode],
+            executor=group_pool,
+            opening_book=OpeningBook(args.opening_book) if args.opening_book else None,
+        )
+    )
+    if args.bot
+    else None
+)
+speed = SPEEDS.index(args.speed)
+paused = False
+show_probabilities = True
+step_requested = False
+last_step_time = 0
+last_move = None
+
+
+def handle_bot_key(key: int) -> None:
+    global game, speed, paused, show_probabilities, step_requested, last_move
+    if key == pygame.K_SPACE:
+        paused = not paused
+    elif key in [pygame.K_RIGHT, pygame.K_s]:
+        step_requested = True
+    elif key == pygame.K_UP:
+        speed = min(speed + 1, len(SPEEDS) - 1)
+    elif key == pygame.K_DOWN:
+        speed = max(speed - 1, 0)
+    elif key == pygame.K_o:
+        show_probabilities = not show_probabilities
+    elif key == pygame.K_n:
+        bot.discard()
+        game = new_game()
+        last_move = None
+
 
 while running:
     # poll for events
@@ -25,16 +112,15 @@ while running:
             running = False
 
         if event.type == pygame.KEYDOWN:
-            game = Game()
+            if args.bot:
+                handle_bot_key(event.key)
+            else:
+                game = new_game()
 
-        if game.state != GameState.IN_PROGRESS:
-            break
+        if args.bot or game.state not in [GameState.UNSTARTED, GameState.IN_PROGRESS]:
+            continue
 
-        if (
-            event.type == pygame.MOUSEBUTTONDOWN
-            and event.button == 1
-            and collision_grid
-        ):
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             holding = True
             hold_start_time = pygame.time.get_ticks()
 
@@ -42,26 +128,52 @@ while running:
             holding = False
             hold_duration = pygame.time.get_ticks() - hold_start_time
 
-            for col in range(0, game.cols):
-                for row in range(0, game.rows):
-                    if collision_grid[col][row].collidepoint(event.pos):
-                        if hold_duration > HOLD_THRESHOLD:
-                            game.flag_slot(row, col)
-                        else:
-                            game.open_slot(row, col)
+            cell = renderer.cell_at(event.pos)
+            if cell is not None:
+                row, col = cell
+                if hold_duration > HOLD_THRESHOLD:
+                    game.flag_slot(row, col)
+                else:
+                    game.open_slot(row, col)
 
-    collision_grid = draw_board(screen=screen, game=game)
-
-    if game.state == GameState.LOST:
-        lose_screen(screen=screen)
-    elif game.state == GameState.WON:
-        win_screen(screen=screen)
+    if args.bot:
+        # the solver runs on its own thread; this loop only hands it the
+        # game and applies the move it returns, so drawing never waits on it
+        move = bot.poll()
+        if move is not None:
+            move.apply(game)
+            last_move = move
+        now = pygame.time.get_ticks()
+        due = not paused and now - last_step_time >= 1000 // SPEEDS[speed]
+        if (
+            (due or step_requested)
+            and game.state in [GameState.UNSTARTED, GameState.IN_PROGRESS]
+            and bot.request(game)
+        ):
+            step_requested = False
+            last_step_time = now
 
-    # flip() the display to put your work on screen
-    pygame.display.flip()
+    probabilities = (
+        last_move.probabilities if last_move and show_probabilities else None
+    )
+    dirty = renderer.draw(game, probabilities)
+    if args.bot:
+        dirty += renderer.draw_status(
+            [
+                f"{SolverMode[args.solver_mode].name}, {SPEEDS[speed]} moves/s",
+                "paused" if paused else ("solving..." if bot.busy else "playing"),
+                f"last move: {last_move.move_type.name}" if last_move else "",
+            ]
+        )
+    # only the cells that changed since the last frame are redrawn and sent
+    # to the display
+    pygame.display.update(dirty)
 
-# limits FPS to 60
-# dt is delta time in seconds since last frame, used for framerate-
-# independent physics.
+    # limits FPS, so an idle board does not spin the CPU
+    clock.tick(FPS)
 
+if bot is not None:
+    bot.stop()
+if group_pool is not None:
+    group_pool.shutdown()
 pygame.quit()
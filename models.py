@@ -1,29 +1,54 @@
 from collections.abc import Sequence
 
 
-class Slot:
+class SlotBase:
+    """What every slot shares: equality and hashing by position. Subclasses
+    store the fields (Slot) or look them up elsewhere (board.SlotView)."""
+
+    # no per-instance __dict__: a grid holds one slot per cell
+    __slots__ = ()
+
     has_mine: bool
     row: int
     col: int
-    is_flagged: bool = False
-    is_opened: bool = False
-    number_of_mines_around: int = 0
-
-    def __init__(self, row, col, has_mine):
-        self.row = row
-        self.col = col
-        self.has_mine = has_mine
+    # col << 16 | row, computed once for hashing; the same for a Slot and a
+    # view of the same position, so they are interchangeable as keys
+    key: int
+    is_flagged: bool
+    is_opened: bool
+    number_of_mines_around: int
 
     def __str__(self):
         return f"slot_{self.row}_{self.col}"
 
     def __eq__(self, other):
-        if not isinstance(other, Slot):
+        if not isinstance(other, SlotBase):
             return False
         return self.row == other.row and self.col == other.col
 
     def __hash__(self):
-        return hash((self.row, self.col))
+        return self.key
+
+
+class Slot(SlotBase):
+    __slots__ = (
+        "row",
+        "col",
+        "key",
+        "has_mine",
+        "is_flagged",
+        "is_opened",
+        "number_of_mines_around",
+    )
+
+    def __init__(self, row, col, has_mine):
+        self.row = row
+        self.col = col
+        self.key = col << 16 | row
+        self.has_mine = has_mine
+        self.is_flagged = False
+        self.is_opened = False
+        self.number_of_mines_around = 0
 
 
-Grid = Sequence[Sequence[Slot]]
+Grid = Sequence[Sequence[SlotBase]]
@@ -0,0 +1,140 @@
+import mmap
+import struct
+from collections.abc import Iterable
+from hashlib import blake2b
+from typing import Optional, Tuple
+
+from board import Board
+
+# A book is HEADER followed by an open-addressing hash table of ENTRY slots:
+#   header: magic, rows, cols, mines, most opened cells a covered position
+#   has, slot count (a power of two)
+#   entry: position key (0 for an empty slot), cell index to open, its mine
+#   probability * PROBABILITY_SCALE
+# A position's slot is key & (slot count - 1), then the next free one.
+MAGIC = b"MSBOK2"
+# books keyed by a hash of the whole visible board, before positions were
+# keyed by Board.position_hash
+OLD_MAGICS = (b"MSBOOK",)
+HEADER = struct.Struct("<6sHHHHI")
+ENTRY = struct.Struct("<QIH")
+PROBABILITY_SCALE = 65535
+
+BookEntry = Tuple[int, float]
+
+
+def position_key(board: Board) -> int:
+    # 64-bit hash of what a player sees: opened numbers and flags; never 0.
+    # The board keeps a hash of those up to date as cells change, so only
+    # the size is mixed in here
+    digest = blake2b(
+        struct.pack("<IIQ", board.rows, board.cols, board.position_hash),
+        digest_size=8,
+    )
+    return int.from_bytes(digest.digest(), "little") or 1
+
+
+def write_book(
+    path: str,
+    rows: int,
+    cols: int,
+    number_of_mines: int,
+    max_opened: int,
+    entries: Iterable[Tuple[int, int, float]],
+) -> int:
+    """Write (key, index, probability) entries as a book file; returns the
+    number of entries written"""
+    entries = list(entries)
+    slot_count = 1
+    while slot_count < 2 * len(entries):
+        slot_count <<= 1
+    mask = slot_count - 1
+    table = bytearray(ENTRY.size * slot_count)
+    for key, index, probability in entries:
+        slot = key & mask
+        while ENTRY.unpack_from(table, slot * ENTRY.size)[0]:
+            slot = (slot + 1) & mask
+        ENTRY.pack_into(
+            table,
+            slot * ENTRY.size,
+            key,
+            index,
+            round(min(max(probability, 0.0), 1.0) * PROBABILITY_SCALE),
+        )
+
+    with open(path, "wb") as book_file:
+        book_file.write(
+            HEADER.pack(MAGIC, rows, cols, number_of_mines, max_opened, slot_count)
+        )
+        book_file.write(table)
+    return len(entries)
+
+
+class OpeningBook:
+    """Read-only, memory-mapped opening book for one board size and mine
+    count. A lookup hashes the position and probes the table in place."""
+
+    rows: int
+    cols: int
+    number_of_mines: int
+    # positions with more opened cells than this are never in the book
+    max_opened: int
+
+    def __init__(self, path: str):
+        with open(path, "rb") as book_file:
+            self._mmap = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            self._mmap.close()
+            raise ValueError(f"{path} is not an opening book")
+        magic, rows, cols, mines, max_opened, slot_count = HEADER.unpack_from(
+            self._mmap
+        )
+        if magic != MAGIC or len(self._mmap) != HEADER.size + ENTRY.size * slot_count:
+            self._mmap.close()
+            if magic in OLD_MAGICS:
+                raise ValueError(f"{path} is an opening book in an older format")
+            raise ValueError(f"{path} is not an opening book")
+        self.rows = rows
+        self.cols = cols
+        self.number_of_mines = mines
+        self.max_opened = max_opened
+        self._mask = slot_count - 1
+
+    def covers(self, rows: int, cols: int, number_of_mines: int, opened: int) -> bool:
+        return (rows, cols, number_of_mines) == (
+            self.rows,
+            self.cols,
+            self.number_of_mines,
+        ) and opened <= self.max_opened
+
+    def lookup(self, board: Board) -> Optional[BookEntry]:
+        # (cell index to open, its mine probability), None if not in the book
+        return self.lookup_key(position_key(board))
+
+    def lookup_key(self, key: int) -> Optional[BookEntry]:
+        slot = key & self._mask
+        while True:
+            stored, index, probability = ENTRY.unpack_from(
+                self._mmap, HEADER.size + slot * ENTRY.size
+            )
+            if stored == key:
+                return index, probability / PROBABILITY_SCALE
+            if not stored:
+                return None
+            slot = (slot + 1) & self._mask
+
+    def __len__(self) -> int:
+        return sum(
+            1
+            for slot in range(self._mask + 1)
+            if ENTRY.unpack_from(self._mmap, HEADER.size + slot * ENTRY.size)[0]
+        )
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __enter__(self) -> "OpeningBook":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
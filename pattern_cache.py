@@ -0,0 +1,146 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from solver import Constraint
+
+Position = Tuple[int, int]
+PatternKey = Hashable
+
+# the 8 rotations and reflections of the square grid
+SYMMETRIES = (
+    lambda r, c: (r, c),
+    lambda r, c: (r, -c),
+    lambda r, c: (-r, c),
+    lambda r, c: (-r, -c),
+    lambda r, c: (c, r),
+    lambda r, c: (c, -r),
+    lambda r, c: (-c, r),
+    lambda r, c: (-c, -r),
+)
+
+
+def canonical_pattern(
+    positions: Sequence[Position], constraints: Sequence[Constraint]
+) -> Tuple[PatternKey, List[int]]:
+    """Key a constraint system by its shape, identical for every rotation,
+    reflection and translation of it. Also returns, for each variable, its
+    index in the canonical ordering."""
+    best_key = None
+    best_order = None
+    for symmetry in SYMMETRIES:
+        moved = [symmetry(row, col) for row, col in positions]
+        min_row = min(row for row, _ in moved)
+        min_col = min(col for _, col in moved)
+        moved = [(row - min_row, col - min_col) for row, col in moved]
+        variables = sorted(moved)
+        scopes = sorted(
+            (tuple(sorted(moved[v] for v in scope)), target)
+            for scope, target in constraints
+        )
+        key = (tuple(variables), tuple(scopes))
+        if best_key is None or key < best_key:
+            rank = {position: i for i, position in enumerate(variables)}
+            best_key = key
+            best_order = [rank[position] for position in moved]
+    return best_key, best_order
+
+
+class PatternCache:
+    """Bounded LRU mapping canonical frontier patterns to the per-variable
+    mine probabilities solved for them (an empty tuple when unsatisfiable).
+    Safe to share between threads."""
+
+    maxsize: int
+    max_variables: int
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize: int = 65536, max_variables: int = 16):
+        self.maxsize = maxsize
+        self.max_variables = max_variables
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[PatternKey, Tuple[float, ...]]" = OrderedDict()
+        self._new_keys = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def accepts(self, variable_count: int) -> bool:
+        return variable_count <= self.max_variables
+
+    def get(self, key: PatternKey) -> Optional[Tuple[float, ...]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: PatternKey, value: Tuple[float, ...]) -> None:
+        with self._lock:
+            self._put(key, value)
+
+    def _put(self, key: PatternKey, value: Tuple[float, ...]) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._new_keys.add(key)
+        self._trim()
+
+    def _trim(self) -> None:
+        while len(self._entries) > self.maxsize:
+            evicted, _ = self._entries.popitem(last=False)
+            self._new_keys.discard(evicted)
+
+    def update(self, entries: Dict[PatternKey, Tuple[float, ...]]) -> None:
+        with self._lock:
+            for key, value in entries.items():
+                self._put(key, value)
+
+    def take_new_entries(self) -> Dict[PatternKey, Tuple[float, ...]]:
+        # entries solved since the last call, for merging caches across processes
+        with self._lock:
+            new_entries = {
+                key: self._entries[key]
+                for key in self._new_keys
+                if key in self._entries
+            }
+            self._new_keys.clear()
+        return new_entries
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def save(self, path: str) -> None:
+        temporary_path = f"{path}.tmp"
+        with self._lock:
+            entries = dict(self._entries)
+        with open(temporary_path, "wb") as cache_file:
+            pickle.dump(entries, cache_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "PatternCache":
+        cache = cls(**kwargs)
+        if os.path.exists(path):
+            with open(path, "rb") as cache_file:
+                cache._entries.update(pickle.load(cache_file))
+            cache._trim()
+        return cache
@@ -0,0 +1,167 @@
+import csv
+import json
+import threading
+from collections import defaultdict
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable)
+
+
+class PhaseStats:
+    calls: int
+    seconds: float
+    max_seconds: float
+    metrics: Dict[str, float]
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.metrics = defaultdict(float)
+
+    def merge(self, other: "PhaseStats") -> None:
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+        for name, value in other.metrics.items():
+            self.metrics[name] += value
+
+
+class Profiler:
+    """Per-phase call counts, wall time and summed metrics (frontier sizes,
+    solution counts, cache hits...). Nested phases each count their own time.
+    Threads sharing a profiler (e.g. a BotWorker next to the UI) each keep
+    their own stack of running phases and add to the same totals."""
+
+    phases: Dict[str, PhaseStats]
+
+    def __init__(self):
+        self.phases = defaultdict(PhaseStats)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"phases": self.phases}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.phases = state["phases"]
+
+    def _stack(self) -> List[str]:
+        # phases running on the calling thread, innermost last
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def enter(self, phase: str) -> None:
+        self._stack().append(phase)
+
+    def exit(self, seconds: float) -> None:
+        phase = self._stack().pop()
+        with self._lock:
+            stats = self.phases[phase]
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def note(self, **metrics: float) -> None:
+        # metrics go to the innermost phase running on this thread
+        stack = self._stack()
+        with self._lock:
+            stats = self.phases[stack[-1] if stack else "unphased"]
+            for name, value in metrics.items():
+                stats.metrics[name] += value
+
+    def merge(self, other: "Profiler") -> None:
+        with self._lock:
+            for phase, stats in other.phases.items():
+                self.phases[phase].merge(stats)
+
+    def rows(self) -> List[Dict[str, float]]:
+        rows = []
+        for phase, stats in sorted(
+            self.phases.items(), key=lambda item: -item[1].seconds
+        ):
+            row = {
+                "phase": phase,
+                "calls": stats.calls,
+                "seconds": stats.seconds,
+                "mean_ms": 1000 * stats.seconds / stats.calls if stats.calls else 0.0,
+                "max_ms": 1000 * stats.max_seconds,
+            }
+            for name, value in sorted(stats.metrics.items()):
+                row[name] = value
+            rows.append(row)
+        return rows
+
+    def summary(self) -> str:
+        lines = [
+            f"{'phase':<16}{'calls':>10}{'seconds':>10}{'mean ms':>10}"
+            f"{'max ms':>10}  metrics"
+        ]
+        for row in self.rows():
+            metrics = " ".join(
+                f"{name}={value:g}"
+                for name, value in row.items()
+                if name not in {"phase", "calls", "seconds", "mean_ms", "max_ms"}
+            )
+            lines.append(
+                f"{row['phase']:<16}{row['calls']:>10}{row['seconds']:>10.3f}"
+                f"{row['mean_ms']:>10.3f}{row['max_ms']:>10.3f}  {metrics}"
+            )
+        return "\n".join(lines)
+
+
+def write_trace(path: str, rows: List[Dict[str, float]]) -> None:
+    if path.endswith(".csv"):
+        fields = []
+        for row in rows:
+            fields.extend(name for name in row if name not in fields)
+        with open(path, "w", newline="") as trace_file:
+            writer = csv.DictWriter(trace_file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, "w") as trace_file:
+            json.dump(rows, trace_file, indent=1)
+
+
+# one profiler for the whole process: every thread's phases are counted in it
+_profiler: Optional[Profiler] = None
+
+
+def set_profiler(profiler: Optional[Profiler]) -> Optional[Profiler]:
+    global _profiler
+    previous, _profiler = _profiler, profiler
+    return previous
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+def note(**metrics: float) -> None:
+    if _profiler is not None:
+        _profiler.note(**metrics)
+
+
+def profiled(phase: str) -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _profiler
+            if profiler is None:
+                return func(*args, **kwargs)
+            profiler.enter(phase)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.exit(perf_counter() - start)
+
+        return wrapper
+
+    return decorator
@@ -1,186 +1,591 @@
-import random
+from collections import deque
+from collections.abc import Mapping, Sequence
+from concurrent.futures import Executor
 from enum import IntEnum
+from random import Random
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
 
+from bitboard import BITBOARD_MAX_CELLS, BitBoard, iter_bits
+from board import Board
 from game import Game, GameState
 from helper import (
-    get_constrained_unopened_slots,
-    get_number_of_surrounding_flags,
-    get_number_of_surrounding_unopened_slots,
-    get_perimeter_groups,
-    get_surrounding_slots,
-    get_unopened_slots,
-    is_slot_unconstrained,
-    risk_score_heuristic,
-    run_CSP_on,
-    run_EPP_on,
+    PARALLEL_GROUP_SIZE,
+    estimate_probabilities_on,
+    run_component_CSP_on,
     run_global_CSP_on,
+    solve_groups,
 )
+from models import SlotBase
+from opening_book import OpeningBook
+from pattern_cache import PatternCache
+from phase_profiler import note, profiled
+from solver import SolverTimeout
+
+# an expert board; global enumeration of larger frontiers rarely finishes
+GLOBAL_CSP_MAX_CELLS = 16 * 30
+# interior slots offered as guesses on boards too large for bitboards
+MAX_INTERIOR_CANDIDATES = 64
 
 
 class MoveType(IntEnum):
     simple = 0
     advanced = 1
     random = 2
+    book = 3
+
+
+class SolverMode(IntEnum):
+    """local_csp solves each perimeter group on its own. global_csp
+    enumerates the whole frontier at once, but only on boards of at most
+    PlayerAlgo.global_csp_max_cells cells (GLOBAL_CSP_MAX_CELLS, an expert
+    board, by default); larger boards are solved as in components mode.
+    components solves each independent frontier component and combines them
+    with the remaining mine count."""
+
+    local_csp = 0
+    global_csp = 1
+    components = 2
+
+
+class MoveResult:
+    move_type: MoveType
+    # the slots the move chose, as (row, col, flagged), in play order
+    actions: List[Tuple[int, int, bool]]
+    # every slot opened, cascades included
+    opened: List[Tuple[int, int]]
+    flagged: List[Tuple[int, int]]
+    # mine probabilities the move was chosen from, by (row, col)
+    probabilities: Dict[Tuple[int, int], float]
+    deductions: int
+
+    def __init__(self, move_type: MoveType):
+        self.move_type = move_type
+        self.actions = []
+        self.opened = []
+        self.flagged = []
+        self.probabilities = {}
+        self.deductions = 0
+
+    def open(self, game: Game, row: int, col: int) -> Sequence[int]:
+        opened = game.open_slot(row, col)
+        if opened:
+            self.actions.append((row, col, False))
+            self.opened.extend(game.board.position(index) for index in opened)
+        return opened
+
+    def flag(self, game: Game, row: int, col: int) -> None:
+        game.board.set_flagged(game.board.index(row, col), True)
+        self.actions.append((row, col, True))
+        self.flagged.append((row, col))
+
+    def apply(self, game: Game) -> None:
+        # replay the chosen slots on another copy of the game this was played on
+        for row, col, flag in self.actions:
+            if flag:
+                game.board.set_flagged(game.board.index(row, col), True)
+            else:
+                game.open_slot(row, col)
 
 
 class PlayerAlgo:
-    use_global_csp: bool = True
-    last_move_played = None
+    """Plays moves on the games it is given. An instance only holds its
+    configuration, so one can drive many games from several threads."""
 
-    @staticmethod
-    def __make_simple_logical_move(game: Game) -> bool:
-        for col in range(len(game.grid)):
-            for row in range(len(game.grid[0])):
-                current_slot = game.grid[col][row]
-                if not current_slot.is_opened:
-                    continue
+    solver_mode: SolverMode
+    pattern_cache: Optional[PatternCache]
+    # seconds allowed per advanced move, None to always solve exactly
+    time_budget: Optional[float]
+    # seconds a make_a_move call may take in all, None for no limit
+    turn_budget: Optional[float]
+    # larger local groups use the native enumerator instead of python-constraint
+    max_csp_group_size: int
+    rng: Random
+    # pool that local groups of at least parallel_group_size slots are solved
+    # in, owned by the caller; None solves every group in this thread
+    executor: Optional[Executor]
+    parallel_group_size: int
+    # early guesses looked up before any solver runs
+    opening_book: Optional[OpeningBook]
+    # larger boards are solved by components in global_csp mode
+    global_csp_max_cells: int
 
-                number_of_surrounding_flags = get_number_of_surrounding_flags(
-                    grid=game.grid, row=row, col=col
-                )
+    def __init__(
+        self,
+        solver_mode: SolverMode = SolverMode.global_csp,
+        pattern_cache: Optional[PatternCache] = None,
+        time_budget: Optional[float] = None,
+        max_csp_group_size: int = 16,
+        rng: Optional[Random] = None,
+        executor: Optional[Executor] = None,
+        parallel_group_size: int = PARALLEL_GROUP_SIZE,
+        opening_book: Optional[OpeningBook] = None,
+        global_csp_max_cells: int = GLOBAL_CSP_MAX_CELLS,
+        turn_budget: Optional[float] = None,
+    ):
+        self.solver_mode = solver_mode
+        self.pattern_cache = (
+            pattern_cache if pattern_cache is not None else PatternCache()
+        )
+        self.time_budget = time_budget
+        self.max_csp_group_size = max_csp_group_size
+        self.rng = rng or Random()
+        self.executor = executor
+        self.parallel_group_size = parallel_group_size
+        self.opening_book = opening_book
+        self.global_csp_max_cells = global_csp_max_cells
+        self.turn_budget = turn_budget
 
-                number_of_surrounding_unopened_slots = (
-                    get_number_of_surrounding_unopened_slots(
-                        grid=game.grid, row=row, col=col
-                    )
-                )
+    @profiled("simple")
+    def __make_simple_logical_moves(self, game: Game) -> Optional[MoveResult]:
+        board = game.board
+        move = MoveResult(MoveType.simple)
+        worklist = deque(sorted(board.constraint_cells))
+        queued = set(worklist)
+        while worklist and game.state == GameState.IN_PROGRESS:
+            cell = worklist.popleft()
+            queued.discard(cell)
+            if cell not in board.constraint_cells:
+                continue
 
-                if number_of_surrounding_flags == number_of_surrounding_unopened_slots:
-                    continue
+            unknown, flags = board.scan_neighbours(cell)
+            mines_left = board.counts[cell] - flags
+            to_flag, to_open = [], []
+            if mines_left == len(unknown):
+                to_flag = unknown
+            elif mines_left == 0:
+                to_open = unknown
+            else:
+                to_flag, to_open = self.__apply_subset_rule(board, unknown, mines_left)
 
-                surrounding_slots = get_surrounding_slots(
-                    grid=game.grid, row=row, col=col
-                )
+            changed = list(to_flag)
+            for index in to_flag:
+                move.flag(game, *board.position(index))
+            for index in to_open:
+                if board.is_unknown(index):
+                    changed.extend(move.open(game, *board.position(index)))
+            if not changed:
+                continue
 
-                only_mines_unopened = (
-                    current_slot.number_of_mines_around
-                    == number_of_surrounding_unopened_slots
-                )
-                if only_mines_unopened:
-                    for slot in surrounding_slots:
-                        if not slot.is_opened and not slot.is_flagged:
-                            slot.is_flagged = True
-                    PlayerAlgo.last_move_played = MoveType.simple
-                    return True
-
-                all_mines_flagged = (
-                    current_slot.number_of_mines_around == number_of_surrounding_flags
-                )
-                if all_mines_flagged:
-                    for slot in surrounding_slots:
-                        if not slot.is_opened and not slot.is_flagged:
-                            game.open_slot(row=slot.row, col=slot.col)
-                    PlayerAlgo.last_move_played = MoveType.simple
-                    return True
-        return False
+            move.deductions += len(to_flag) + len(to_open)
+            # only cells near something that changed can yield new deductions:
+            # next to it, their own unknowns changed; two cells away, those of
+            # the partners their subset rule compares against
+            nearby = set()
+            for index in changed:
+                for near in (index, *board.neighbours[index]):
+                    nearby.add(near)
+                    nearby.update(board.neighbours[near])
+            for neighbour in sorted(nearby & board.constraint_cells - queued):
+                queued.add(neighbour)
+                worklist.append(neighbour)
+
+        note(deductions=move.deductions)
+        return move if move.deductions else None
+
+    @staticmethod
+    def __apply_subset_rule(
+        board: Board, unknown: Sequence[int], mines_left: int
+    ) -> Tuple[Sequence[int], Sequence[int]]:
+        # if this cell's unknowns are a subset of another's, the difference
+        # holds exactly the difference in their remaining mines ("1-2" pattern)
+        unknown_set = set(unknown)
+        nearby = {
+            neighbour
+            for index in unknown
+            for neighbour in board.neighbours[index]
+            if neighbour in board.constraint_cells
+        }
+        for other in nearby:
+            other_unknown, other_flags = board.scan_neighbours(other)
+            if len(other_unknown) <= len(unknown) or not unknown_set.issubset(
+                other_unknown
+            ):
+                continue
+            difference = [index for index in other_unknown if index not in unknown_set]
+            extra_mines = board.counts[other] - other_flags - mines_left
+            if extra_mines == 0:
+                return [], difference
+            if extra_mines == len(difference):
+                return difference, []
+        return [], []
+
+    def __deadlines(
+        self, turn_deadline: Optional[float] = None
+    ) -> Tuple[Optional[float], Optional[float]]:
+        # exact solving gets the first half of the budget, sampling the rest;
+        # the budget never runs past the end of the turn
+        start = perf_counter()
+        end = None if self.time_budget is None else start + self.time_budget
+        if turn_deadline is not None:
+            end = turn_deadline if end is None else min(end, turn_deadline)
+        if end is None:
+            return None, None
+        return start + max(end - start, 0.0) / 2, end
+
+    def __open_safest(
+        self, game: Game, move: MoveResult, probabilities: Mapping[SlotBase, float]
+    ) -> None:
+        lowest_prob = min(probabilities.values())
+        safest_slots = [
+            slot
+            for slot, prob in probabilities.items()
+            if abs(prob - lowest_prob) < 1e-6
+        ]
+        chosen_slot = self.rng.choice(safest_slots)
+        move.open(game, chosen_slot.row, chosen_slot.col)
 
     @staticmethod
-    def __make_advanced_logical_move(game: Game) -> bool:
-        constrained_slots = get_constrained_unopened_slots(grid=game.grid)
+    def __record(move: MoveResult, probabilities: Mapping[SlotBase, float]) -> None:
+        for slot, probability in probabilities.items():
+            move.probabilities[(slot.row, slot.col)] = probability
+
+    def __make_sampled_move(
+        self,
+        game: Game,
+        constrained_slots: Sequence[SlotBase],
+        deadline: float,
+        unconstrained_slots: Sequence[SlotBase] = (),
+        remaining_mines: Optional[int] = None,
+        interior_count: Optional[int] = None,
+    ) -> Optional[MoveResult]:
+        estimates = estimate_probabilities_on(
+            grid=game.grid,
+            constrained_slots=constrained_slots,
+            deadline=deadline,
+            unconstrained_slots=unconstrained_slots,
+            remaining_mines=remaining_mines,
+            constraint_slots=game.get_constraint_slots(),
+            rng=self.rng,
+            interior_count=interior_count,
+        )
+        if not estimates:
+            return None
+
+        # sampled estimates are never treated as certain: guess the slot whose
+        # upper confidence bound on holding a mine is lowest
+        upper_bounds = {
+            slot: probability + half_width
+            for slot, (probability, half_width) in estimates.items()
+        }
+        move = MoveResult(MoveType.advanced)
+        self.__record(move, upper_bounds)
+        self.__open_safest(game, move, upper_bounds)
+        return move
+
+    def __make_book_move(self, game: Game) -> Optional[MoveResult]:
+        # the book only holds positions with no certain move, so a hit is
+        # the guess the solvers would have had to make
+        book = self.opening_book
+        board = game.board
+        if book is None or not book.covers(
+            game.rows, game.cols, game.number_of_mines, board.size - game.unopened
+        ):
+            return None
+        entry = book.lookup(board)
+        note(book_hits=entry is not None, book_misses=entry is None)
+        if entry is None:
+            return None
+        index, probability = entry
+        move = MoveResult(MoveType.book)
+        move.probabilities[board.position(index)] = probability
+        if not move.open(game, *board.position(index)):
+            return None
+        return move
+
+    @profiled("advanced")
+    def __make_advanced_logical_move(
+        self, game: Game, turn_deadline: Optional[float] = None
+    ) -> Optional[MoveResult]:
+        constrained_slots = game.get_constrained_unopened_slots()
+        exact_deadline, deadline = self.__deadlines(turn_deadline)
+        # one global enumeration multiplies the solutions of every component,
+        # so past global_csp_max_cells global mode solves by components
+        if self.solver_mode == SolverMode.components or (
+            self.solver_mode == SolverMode.global_csp
+            and game.board.size > self.global_csp_max_cells
+        ):
+            return self.__make_component_move(
+                game, constrained_slots, exact_deadline, deadline
+            )
         if len(constrained_slots) < 3:
-            return False
+            return None
+        move = MoveResult(MoveType.advanced)
         end = False
         best_moves = {}
-        if PlayerAlgo.use_global_csp:
-            probabilities = run_global_CSP_on(
-                grid=game.grid,
-                constrained_slots=constrained_slots,
-                remaining_mines=game.number_of_mines - game.get_flag_total(),
-            )
+        if self.solver_mode == SolverMode.global_csp:
+            remaining_mines = game.number_of_mines - game.get_flag_total()
+            try:
+                probabilities = run_global_CSP_on(
+                    grid=game.grid,
+                    constrained_slots=constrained_slots,
+                    remaining_mines=remaining_mines,
+                    constraint_slots=game.get_constraint_slots(),
+                    deadline=exact_deadline,
+                )
+            except SolverTimeout:
+                return self.__make_sampled_move(game, constrained_slots, deadline)
             if not probabilities:
-                return False
+                return None
 
+            self.__record(move, probabilities)
             for slot, probability in probabilities.items():
                 if probability < 1e-6:
-                    game.open_slot(row=slot.row, col=slot.col)
+                    move.open(game, slot.row, slot.col)
                     end = True
                 elif probability > 1 - 1e-6:
-                    slot.is_flagged = True
+                    move.flag(game, slot.row, slot.col)
                     end = True
         else:
-            groups = get_perimeter_groups(
-                grid=game.grid, perimeter_slots=constrained_slots
+            # groups are solved before any of their moves are played: each
+            # group's constraints were fixed when it was grouped
+            groups = game.get_perimeter_groups()
+            solved = solve_groups(
+                grid=game.grid,
+                groups=groups,
+                cache=self.pattern_cache,
+                max_csp_group_size=self.max_csp_group_size,
+                deadline=exact_deadline,
+                executor=self.executor,
+                parallel_group_size=self.parallel_group_size,
             )
-            use_CSP = True if game.rows <= 9 and game.cols <= 9 else groups > 10
-            for group in groups:
-                probabilities = (
-                    run_CSP_on(grid=game.grid, grouped_slots=group)
-                    if use_CSP
-                    else run_EPP_on(grid=game.grid, grouped_slots=group)
-                )
+            for group, probabilities in zip(groups, solved):
+                if probabilities is None:
+                    estimates = estimate_probabilities_on(
+                        grid=game.grid,
+                        constrained_slots=group,
+                        deadline=deadline,
+                        rng=self.rng,
+                    )
+                    for slot, (probability, half_width) in estimates.items():
+                        best_moves[slot] = probability + half_width
+                    continue
                 if not probabilities:
                     continue
 
+                self.__record(move, probabilities)
                 for slot, probability in probabilities.items():
                     if probability == 0:
-                        game.open_slot(row=slot.row, col=slot.col)
+                        move.open(game, slot.row, slot.col)
                         end = True
                     elif probability == 1:
-                        slot.is_flagged = True
+                        move.flag(game, slot.row, slot.col)
                         end = True
                     elif slot not in best_moves or probability < best_moves[slot]:
                         best_moves[slot] = probability
 
         if end:
-            PlayerAlgo.last_move_played = MoveType.advanced
-            return True
+            return move
         if not best_moves or len(best_moves) == 1 and len(groups) != 1:
-            return False
+            return None
 
-        lowest_prob = min(best_moves.values())
-        safest_slots = [
-            slot for slot, prob in best_moves.items() if abs(prob - lowest_prob) < 1e-6
-        ]
-        chosen_slot = random.choice(safest_slots)
-        game.open_slot(row=chosen_slot.row, col=chosen_slot.col)
-        PlayerAlgo.last_move_played = MoveType.advanced
-        return True
+        self.__record(move, best_moves)
+        self.__open_safest(game, move, best_moves)
+        return move
 
-    @staticmethod
-    def __make_random_move(game: Game) -> None:
+    def __make_component_move(
+        self,
+        game: Game,
+        constrained_slots: Sequence[SlotBase],
+        exact_deadline: Optional[float],
+        deadline: Optional[float],
+    ) -> Optional[MoveResult]:
+        if not constrained_slots:
+            return None
+        if game.board.size <= BITBOARD_MAX_CELLS:
+            unconstrained_slots = game.get_unconstrained_unopened_slots()
+            interior_count = len(unconstrained_slots)
+        else:
+            # every interior slot has the same probability, so on large boards
+            # only a few are offered as guesses and the rest are only counted
+            unconstrained_slots = game.get_unconstrained_unopened_slots(
+                limit=MAX_INTERIOR_CANDIDATES
+            )
+            interior_count = game.count_unconstrained_unopened_slots()
+        remaining_mines = game.number_of_mines - game.get_flag_total()
+        try:
+            probabilities = run_component_CSP_on(
+                grid=game.grid,
+                constrained_slots=constrained_slots,
+                unconstrained_slots=unconstrained_slots,
+                remaining_mines=remaining_mines,
+                constraint_slots=game.get_constraint_slots(),
+                deadline=exact_deadline,
+                interior_count=interior_count,
+            )
+        except SolverTimeout:
+            return self.__make_sampled_move(
+                game,
+                constrained_slots,
+                deadline,
+                unconstrained_slots,
+                remaining_mines,
+                interior_count,
+            )
+        if not probabilities:
+            return None
+
+        move = MoveResult(MoveType.advanced)
+        self.__record(move, probabilities)
+        end = False
+        for slot, probability in probabilities.items():
+            if probability < 1e-6:
+                move.open(game, slot.row, slot.col)
+                end = True
+            elif probability > 1 - 1e-6:
+                move.flag(game, slot.row, slot.col)
+                end = True
+
+        if not end:
+            # no certain move: open the slot least likely to hold a mine,
+            # interior slots included
+            self.__open_safest(game, move, probabilities)
+        return move
+
+    @profiled("random")
+    def __make_random_move(self, game: Game) -> Optional[MoveResult]:
+        move = MoveResult(MoveType.random)
         if game.state == GameState.UNSTARTED:
             middle_row = game.rows // 2
             middle_col = game.cols // 2
-            game.open_slot(row=middle_row, col=middle_col)
-            PlayerAlgo.last_move_played = MoveType.random
-            return
-        unopened_slots = get_unopened_slots(grid=game.grid)
-        if not unopened_slots:
-            return
-
-        # check edges and corners
-        for slot in unopened_slots:
-            if slot.row in {0, game.rows - 1} or slot.col in {
-                0,
-                game.cols - 1,
-            }:
-                if is_slot_unconstrained(grid=game.grid, row=slot.row, col=slot.col):
-                    game.open_slot(row=slot.row, col=slot.col)
-                    PlayerAlgo.last_move_played = MoveType.random
-                    return
-
-        # check interior slots
-        for slot in unopened_slots:
-            if slot.row in {0, game.rows - 1} or slot.col in {0, game.cols - 1}:
-                continue
-            if is_slot_unconstrained(grid=game.grid, row=slot.row, col=slot.col):
-                game.open_slot(row=slot.row, col=slot.col)
-                PlayerAlgo.last_move_played = MoveType.random
-                return
-
-        # get least constrained slot
-        fallback = min(
-            unopened_slots,
-            key=lambda slot: risk_score_heuristic(grid=game.grid, slot=slot),
-        )
-        game.open_slot(row=fallback.row, col=fallback.col)
-        PlayerAlgo.last_move_played = MoveType.random
+            move.open(game, middle_row, middle_col)
+            return move
+        board = game.board
+        if board.size <= BITBOARD_MAX_CELLS:
+            index = self.__pick_random_index(BitBoard(board))
+            if index is None:
+                return None
+            move.open(game, *board.position(index))
+            return move
+
+        index = self.__pick_large_board_index(board)
+        if index is None:
+            return None
+        move.open(game, *board.position(index))
+        return move
 
     @staticmethod
-    def make_a_move(game: Game) -> None:
-        while game.state in [GameState.IN_PROGRESS, GameState.UNSTARTED] and (
-            PlayerAlgo.__make_simple_logical_move(game)
-            or PlayerAlgo.__make_advanced_logical_move(game)
-        ):
-            pass
-        PlayerAlgo.__make_random_move(game=game)
+    def __pick_random_index(bits: BitBoard) -> Optional[int]:
+        # an unconstrained edge cell, else any unconstrained cell, lowest
+        # index first; with none left, the frontier cell with the best
+        # risk score
+        if not bits.unknown:
+            return None
+        unconstrained = bits.unconstrained()
+        for candidates in (unconstrained & bits.edge, unconstrained):
+            if candidates:
+                return (candidates & -candidates).bit_length() - 1
+        return min(iter_bits(bits.unknown), key=bits.risk_score)
+
+    @staticmethod
+    def __pick_large_board_index(board: Board) -> Optional[int]:
+        # the same choice as __pick_random_index, scanning only as far as
+        # the first candidate: edge cells first, then interior ones
+        rows, cols = board.rows, board.cols
+        edges = (
+            index
+            for col in range(cols)
+            for index in (
+                range(col * rows, (col + 1) * rows)
+                if col in {0, cols - 1}
+                else (col * rows, (col + 1) * rows - 1)
+            )
+        )
+        for index in edges:
+            if board.is_unconstrained(index):
+                return index
+        for index in board.iter_unconstrained():
+            row, col = board.position(index)
+            if 0 < row < rows - 1 and 0 < col < cols - 1:
+                return index
+        # with nothing unconstrained, every unknown cell is on the frontier
+        if not board.frontier:
+            return None
+        return min(sorted(board.frontier), key=board.risk_score)
+
+    def make_a_move(self, game: Game) -> List[MoveResult]:
+        """Play logical moves for as long as there are any, then one guess.
+        Returns every move played, in order. Past turn_budget, returns the
+        logical moves played so far without guessing; calling again resumes."""
+        turn_deadline = (
+            None if self.turn_budget is None else perf_counter() + self.turn_budget
+        )
+        moves = []
+        while game.state in [GameState.IN_PROGRESS, GameState.UNSTARTED]:
+            move = (
+                self.__make_simple_logical_moves(game)
+                or self.__make_book_move(game)
+                or self.__make_advanced_logical_move(game, turn_deadline)
+            )
+            if move is None:
+                break
+            moves.append(move)
+            if turn_deadline is not None and perf_counter() > turn_deadline:
+                return moves
+        move = self.__make_random_move(game)
+        if move is not None:
+            moves.append(move)
+        return moves
+
+    def play_step(self, game: Game) -> Optional[MoveResult]:
+        """Play a single move: a simple pass, else a book move, else an
+        advanced move, else a guess. Repeated, this plays the same game as make_a_move.
+        """
+        if game.state not in [GameState.IN_PROGRESS, GameState.UNSTARTED]:
+            return None
+        return (
+            self.__make_simple_logical_moves(game)
+            or self.__make_book_move(game)
+            or self.__make_advanced_logical_move(game)
+            or self.__make_random_move(game)
+        )
+
+    def advise(self, game: Game) -> Dict[Tuple[int, int], float]:
+        """Mine probability of every unopened, unflagged slot by (row, col),
+        without playing. Always solves the whole board by components; empty
+        when the board is inconsistent."""
+        board = game.board
+        # opened zeros only have unknown neighbours on boards that were not
+        # played out by Game, so they are not in board.constraint_cells
+        if board.size <= BITBOARD_MAX_CELLS:
+            bits = BitBoard(board)
+            if not bits.check_config():
+                return {}
+            constraint_indices = iter_bits(bits.constraints())
+        else:
+            constraint_indices = (
+                index
+                for index in range(board.size)
+                if board.opened[index] and board.has_unknown_neighbour(index)
+            )
+        constraint_slots = [game.get_slot(index) for index in constraint_indices]
+        constrained_slots = game.get_constrained_unopened_slots()
+        unconstrained_slots = game.get_unconstrained_unopened_slots()
+        remaining_mines = game.number_of_mines - game.get_flag_total()
+        exact_deadline, deadline = self.__deadlines()
+        try:
+            probabilities = run_component_CSP_on(
+                grid=game.grid,
+                constrained_slots=constrained_slots,
+                unconstrained_slots=unconstrained_slots,
+                remaining_mines=remaining_mines,
+                constraint_slots=constraint_slots,
+                deadline=exact_deadline,
+            )
+        except SolverTimeout:
+            estimates = estimate_probabilities_on(
+                grid=game.grid,
+                constrained_slots=constrained_slots,
+                deadline=deadline,
+                unconstrained_slots=unconstrained_slots,
+                remaining_mines=remaining_mines,
+                constraint_slots=constraint_slots,
+                rng=self.rng,
+            )
+            probabilities = {
+                slot: probability for slot, (probability, _) in estimates.items()
+            }
+        return {
+            (slot.row, slot.col): probability
+            for slot, probability in probabilities.items()
+        }
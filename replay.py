@@ -0,0 +1,96 @@
+import argparse
+from collections import Counter
+from collections.abc import Iterator
+from typing import Optional, Tuple
+
+from game import Game, GameState
+from game_log import GameLog, GameRecord, LoggedMove
+from player_algo import MoveType
+
+
+def replay(record: GameRecord) -> Iterator[Tuple[LoggedMove, Game]]:
+    # yields the game after each logged move
+    game = record.new_game()
+    for move in record.moves:
+        row, col = game.board.position(move.index)
+        if move.flag:
+            if not game.board.flagged[move.index]:
+                game.flag_slot(row, col)
+        else:
+            game.open_slot(row, col)
+        yield move, game
+
+
+def describe(game: Game, move: LoggedMove) -> str:
+    row, col = game.board.position(move.index)
+    action = "flag" if move.flag else "open"
+    probability = "" if move.probability is None else f" p={move.probability:.3f}"
+    return f"{move.move_type.name:<9}{action} ({row}, {col}){probability}"
+
+
+def print_game(record: GameRecord) -> None:
+    game = record.new_game()
+    for step, (move, game) in enumerate(replay(record), start=1):
+        print(f"{step:>4} {describe(game, move)}")
+        print("\n".join(f"     {line}" for line in game.observation()))
+    print(f"final state {game.state.name}, logged {record.state.name}")
+
+
+def print_losses(log: GameLog) -> None:
+    for number, record in enumerate(log):
+        if record.state != GameState.LOST or not record.moves:
+            continue
+        last = record.moves[-1]
+        probability = "-" if last.probability is None else f"{last.probability:.3f}"
+        print(
+            f"{number} {record.new_game().board_id} "
+            f"{last.move_type.name} p={probability}"
+        )
+
+
+def print_summary(log: GameLog) -> None:
+    games = won = 0
+    lost_by = Counter()
+    # probability of the losing guess, in tenths
+    losing_odds = Counter()
+    for record in log:
+        games += 1
+        if record.state == GameState.WON:
+            won += 1
+        elif record.moves:
+            last = record.moves[-1]
+            lost_by[last.move_type] += 1
+            if last.probability is not None:
+                losing_odds[min(int(last.probability * 10), 9)] += 1
+    print(f"games {games} won {won} win rate {won / games if games else 0.0:.4f}")
+    for move_type in MoveType:
+        print(f"lost on {move_type.name}: {lost_by[move_type]}")
+    for tenth in sorted(losing_odds):
+        print(
+            f"losing guesses with p in [{tenth / 10:.1f}, {(tenth + 1) / 10:.1f}):"
+            f" {losing_odds[tenth]}"
+        )
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect and replay a game log")
+    parser.add_argument("log", help="a log written by simulation.py --game-log")
+    parser.add_argument("--game", type=int, help="step through this game")
+    parser.add_argument(
+        "--losses",
+        action="store_true",
+        help="list lost games with their board id and last move",
+    )
+    args = parser.parse_args(argv)
+
+    with GameLog(args.log) as log:
+        if args.game is not None:
+            print_game(log[args.game])
+        elif args.losses:
+            print_losses(log)
+        else:
+            print_summary(log)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import json
+import os
+import traceback
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+from urllib.request import Request, urlopen
+
+from game import Game
+from player_algo import PlayerAlgo
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_TIME_BUDGET = 5.0
+MAX_BODY_BYTES = 1 << 20
+READ_TIMEOUT = 30.0
+# boards with a larger frontier, or more cells, are parsed and solved in the
+# worker pool, so long solves never hold up the event loop
+INLINE_FRONTIER_LIMIT = 24
+INLINE_CELL_LIMIT = 16 * 30
+
+Observation = Mapping
+
+
+class RequestError(Exception):
+    status: HTTPStatus
+    message: str
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_observation(observation: Observation) -> Game:
+    # {"mines": total mines, "board": ["1F..", "2...", ...]}, see
+    # Game.from_observation for the slot characters
+    if not isinstance(observation, Mapping):
+        raise ValueError("a board must be a JSON object")
+    number_of_mines = observation.get("mines")
+    cells = observation.get("board")
+    if not isinstance(number_of_mines, int) or number_of_mines < 0:
+        raise ValueError('"mines" must be a non-negative integer')
+    if not isinstance(cells, list) or not all(isinstance(r, str) for r in cells):
+        raise ValueError('"board" must be a list of strings, one per row')
+    return Game.from_observation(number_of_mines, cells)
+
+
+def observation_cells(observation: Observation) -> int:
+    # rows * cols as sent, without parsing the board; 0 if it is malformed
+    cells = observation.get("board") if isinstance(observation, Mapping) else None
+    if not isinstance(cells, list) or not cells or not isinstance(cells[0], str):
+        return 0
+    return len(cells) * len(cells[0])
+
+
+def advise(game: Game, time_budget: Optional[float]) -> Dict:
+    probabilities = PlayerAlgo(time_budget=time_budget).advise(game)
+    if not probabilities and game.unopened > game.get_flag_total():
+        raise ValueError("no mine layout matches this board")
+
+    grid: List[List[Optional[float]]] = [[None] * game.cols for _ in range(game.rows)]
+    safe, mines = [], []
+    for (row, col), probability in sorted(probabilities.items()):
+        grid[row][col] = probability
+        if probability < 1e-6:
+            safe.append([row, col])
+        elif probability > 1 - 1e-6:
+            mines.append([row, col])
+    # the safest slot that is not a certain mine
+    candidates = [
+        position
+        for position, probability in probabilities.items()
+        if probability <= 1 - 1e-6
+    ]
+    best = None
+    if candidates:
+        best = list(min(candidates, key=lambda position: probabilities[position]))
+    return {"safe": safe, "mines": mines, "best": best, "probabilities": grid}
+
+
+def solve_observation(observation: Observation, time_budget: Optional[float]) -> Dict:
+    return advise(parse_observation(observation), time_budget)
+
+
+class AdviceServer:
+    """Answers next-move queries over HTTP/JSON.
+
+    POST /solve takes one observation and returns the certain safe slots,
+    the certain mines, the safest slot and a probability per slot (null for
+    opened and flagged slots). POST /solve/batch takes {"boards": [...]} and
+    answers each board, or gives it an "error". GET /health returns ok."""
+
+    workers: Optional[int]
+    time_budget: Optional[float]
+    inline_frontier_limit: int
+    inline_cell_limit: int
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        time_budget: Optional[float] = DEFAULT_TIME_BUDGET,
+        inline_frontier_limit: int = INLINE_FRONTIER_LIMIT,
+        inline_cell_limit: int = INLINE_CELL_LIMIT,
+    ):
+        self.workers = workers
+        self.time_budget = time_budget
+        self.inline_frontier_limit = inline_frontier_limit
+        self.inline_cell_limit = inline_cell_limit
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pool_slots: Optional[asyncio.Semaphore] = None
+
+    def _request_budget(self, observation: Observation) -> Optional[float]:
+        # clients may ask for less time than the server allows, never more
+        requested = observation.get("time_budget")
+        if not isinstance(requested, (int, float)) or requested <= 0:
+            return self.time_budget
+        if self.time_budget is None:
+            return float(requested)
+        return min(float(requested), self.time_budget)
+
+    async def solve(self, observation: Observation) -> Dict:
+        # parsing and advising cost time in the number of cells, so only small
+        # boards are even parsed here; malformed boards count as small and
+        # fail to parse
+        if observation_cells(observation) <= self.inline_cell_limit:
+            game = parse_observation(observation)
+            if len(game.board.frontier) <= self.inline_frontier_limit:
+                return advise(game, self._request_budget(observation))
+        time_budget = self._request_budget(observation)
+
+        # waiting here, rather than queueing in the executor, bounds the
+        # number of solves in flight
+        async with self._pool_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, solve_observation, observation, time_budget
+            )
+
+    async def solve_batch(self, observations: List[Observation]) -> List[Dict]:
+        async def solve_one(observation: Observation) -> Dict:
+            try:
+                return await self.solve(observation)
+            except ValueError as error:
+                return {"error": str(error)}
+
+        return await asyncio.gather(*(solve_one(o) for o in observations))
+
+    async def route(
+        self, method: str, path: str, body: bytes
+    ) -> Tuple[HTTPStatus, Dict]:
+        if method == "GET" and path == "/health":
+            return HTTPStatus.OK, {"status": "ok"}
+        if method != "POST" or path not in {"/solve", "/solve/batch"}:
+            return HTTPStatus.NOT_FOUND, {"error": f"no route for {method} {path}"}
+
+        try:
+            payload = json.loads(body)
+            if path == "/solve":
+                return HTTPStatus.OK, await self.solve(payload)
+            boards = payload.get("boards") if isinstance(payload, Mapping) else None
+            if not isinstance(boards, list):
+                raise ValueError('a batch must be {"boards": [...]}')
+            return HTTPStatus.OK, {"results": await self.solve_batch(boards)}
+        except ValueError as error:
+            return HTTPStatus.BAD_REQUEST, {"error": str(error)}
+
+    async def read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Tuple[str, str, bytes]:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "malformed request line")
+        method, path, _ = request_line
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in {b"\r\n", b"\n", b""}:
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "bad Content-Length")
+        if length < 0:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "bad Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "body too large")
+        return method, path, await reader.readexactly(length)
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            # only reading is timed, solves are bounded by the time budget
+            method, path, body = await asyncio.wait_for(
+                self.read_request(reader), READ_TIMEOUT
+            )
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+        except RequestError as error:
+            status, payload = error.status, {"error": error.message}
+        else:
+            try:
+                status, payload = await self.route(method, path, body)
+            except Exception:
+                # a bug or a broken worker pool still gets the client an
+                # answer; the traceback goes to the server's stderr
+                traceback.print_exc()
+                status = HTTPStatus.INTERNAL_SERVER_ERROR
+                payload = {"error": "internal error"}
+
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        workers = self.workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            self._executor = executor
+            self._pool_slots = asyncio.Semaphore(workers)
+            server = await asyncio.start_server(self.handle, host, port)
+            async with server:
+                await server.serve_forever()
+
+
+def post(
+    path: str,
+    payload: Mapping,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+) -> Dict:
+    # minimal client for scripts talking to a local server
+    request = Request(
+        f"http://{host}:{port}{path}",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urlopen(request) as response:
+        return json.load(response)
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve next-move advice over HTTP")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="defaults to the CPU count"
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=DEFAULT_TIME_BUDGET,
+        help="most seconds a solve may take before falling back to sampling",
+    )
+    parser.add_argument(
+        "--inline-frontier",
+        type=int,
+        default=INLINE_FRONTIER_LIMIT,
+        help="boards with a larger frontier are solved in the worker pool",
+    )
+    parser.add_argument(
+        "--inline-cells",
+        type=int,
+        default=INLINE_CELL_LIMIT,
+        help="boards with more cells are parsed and solved in the worker pool",
+    )
+    args = parser.parse_args(argv)
+
+    server = AdviceServer(
+        workers=args.workers,
+        time_budget=args.time_budget,
+        inline_frontier_limit=args.inline_frontier,
+        inline_cell_limit=args.inline_cells,
+    )
+    print(f"serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
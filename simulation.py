@@ -0,0 +1,376 @@
+import argparse
+import random
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from batch import iter_games
+from game import COLS, NUMBER_OF_MINES, PRESETS, ROWS, Game, GameState, resolve_preset
+from game_log import GameLogWriter, encode_game
+from opening_book import OpeningBook
+from pattern_cache import PatternCache, PatternKey
+from phase_profiler import Profiler, set_profiler, write_trace
+from player_algo import MoveType, PlayerAlgo, SolverMode
+
+DEFAULT_CHUNK_SIZE = 250
+
+
+class SimulationConfig:
+    number_of_mines: int
+    rows: int
+    cols: int
+    safe_first_click: bool
+    record_losses: bool
+    solver_mode: SolverMode
+    pattern_cache_path: Optional[str]
+    batch_size: Optional[int]
+    time_budget: Optional[float]
+    profile: bool
+    game_log_path: Optional[str]
+    opening_book_path: Optional[str]
+
+    def __init__(
+        self,
+        number_of_mines: int = NUMBER_OF_MINES,
+        rows: int = ROWS,
+        cols: int = COLS,
+        safe_first_click: bool = False,
+        record_losses: bool = False,
+        solver_mode: SolverMode = SolverMode.global_csp,
+        pattern_cache_path: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        time_budget: Optional[float] = None,
+        profile: bool = False,
+        game_log_path: Optional[str] = None,
+        opening_book_path: Optional[str] = None,
+    ):
+        self.number_of_mines = number_of_mines
+        self.rows = rows
+        self.cols = cols
+        self.safe_first_click = safe_first_click
+        self.record_losses = record_losses
+        self.solver_mode = solver_mode
+        self.pattern_cache_path = pattern_cache_path
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.profile = profile
+        self.game_log_path = game_log_path
+        self.opening_book_path = opening_book_path
+
+
+class SimulationResult:
+    games: int
+    won: int
+    lost: Dict[MoveType, int]
+    lost_board_ids: List[str]
+    simple_deductions: int
+    cache_hits: int
+    cache_misses: int
+    pattern_entries: Dict[PatternKey, Tuple[float, ...]]
+    profile: Optional[Profiler]
+    # encoded games of one chunk, appended to the log as the chunk arrives
+    game_log: bytes
+    trace: List[Dict[str, float]]
+    elapsed: float = 0.0
+
+    def __init__(self):
+        self.games = 0
+        self.won = 0
+        self.lost = defaultdict(int)
+        self.lost_board_ids = []
+        self.simple_deductions = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.pattern_entries = {}
+        self.profile = None
+        self.game_log = b""
+        self.trace = []
+
+    def merge(self, other: "SimulationResult") -> None:
+        self.games += other.games
+        self.won += other.won
+        for move_type, count in other.lost.items():
+            self.lost[move_type] += count
+        self.lost_board_ids.extend(other.lost_board_ids)
+        self.simple_deductions += other.simple_deductions
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        if other.profile is not None:
+            if self.profile is None:
+                self.profile = Profiler()
+            self.profile.merge(other.profile)
+
+    @property
+    def win_rate(self) -> float:
+        return self.won / float(self.games) if self.games else 0.0
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.elapsed if self.elapsed else 0.0
+
+
+# shared by every chunk a process plays, so patterns solved in one help the next
+_pattern_cache = PatternCache()
+_opening_book: Optional[OpeningBook] = None
+
+
+def init_worker(
+    pattern_cache_path: Optional[str], opening_book_path: Optional[str] = None
+) -> None:
+    global _pattern_cache, _opening_book
+    _pattern_cache = (
+        PatternCache.load(pattern_cache_path) if pattern_cache_path else PatternCache()
+    )
+    _opening_book = OpeningBook(opening_book_path) if opening_book_path else None
+
+
+def generate_games(seed: int, games: int, config: SimulationConfig) -> Iterator[Game]:
+    if config.batch_size:
+        yield from iter_games(
+            games,
+            config.number_of_mines,
+            config.rows,
+            config.cols,
+            seed=seed,
+            batch_size=config.batch_size,
+        )
+        return
+
+    board_seeds = random.Random(seed)
+    for _ in range(games):
+        yield Game(
+            number_of_mines=config.number_of_mines,
+            rows=config.rows,
+            cols=config.cols,
+            seed=board_seeds.getrandbits(64),
+            safe_first_click=config.safe_first_click,
+        )
+
+
+def play_chunk(seed: int, games: int, config: SimulationConfig) -> SimulationResult:
+    # every chunk is seeded, so results do not depend on which worker ran it
+    player = PlayerAlgo(
+        solver_mode=config.solver_mode,
+        pattern_cache=_pattern_cache,
+        time_budget=config.time_budget,
+        rng=random.Random(seed),
+        opening_book=_opening_book,
+    )
+    cache = player.pattern_cache
+    hits_before = cache.hits if cache else 0
+    misses_before = cache.misses if cache else 0
+    result = SimulationResult()
+    if config.profile:
+        result.profile = Profiler()
+    game_log = bytearray()
+    previous_profiler = set_profiler(result.profile)
+    try:
+        for game in generate_games(seed, games, config):
+            moves = []
+            while game.state in [GameState.UNSTARTED, GameState.IN_PROGRESS]:
+                moves.extend(player.make_a_move(game=game))
+            result.simple_deductions += sum(
+                move.deductions for move in moves if move.move_type == MoveType.simple
+            )
+            if config.game_log_path:
+                game_log.extend(encode_game(game, moves))
+            result.games += 1
+            if game.state == GameState.WON:
+                result.won += 1
+            else:
+                result.lost[moves[-1].move_type] += 1
+                if config.record_losses:
+                    result.lost_board_ids.append(game.board_id)
+    finally:
+        set_profiler(previous_profiler)
+    result.game_log = bytes(game_log)
+    if cache:
+        result.cache_hits = cache.hits - hits_before
+        result.cache_misses = cache.misses - misses_before
+        if config.pattern_cache_path:
+            result.pattern_entries = cache.take_new_entries()
+    return result
+
+
+def run_simulation(
+    total_games: int,
+    workers: Optional[int] = None,
+    seed: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    config: Optional[SimulationConfig] = None,
+) -> SimulationResult:
+    config = config or SimulationConfig()
+    seeds = random.Random(seed)
+    chunks = []
+    for start in range(0, total_games, chunk_size):
+        chunks.append((seeds.getrandbits(64), min(chunk_size, total_games - start)))
+
+    result = SimulationResult()
+    # patterns solved by the workers are merged here and written back once
+    pattern_cache = None
+    if config.pattern_cache_path:
+        pattern_cache = PatternCache.load(config.pattern_cache_path)
+
+    game_log = None
+    if config.game_log_path:
+        game_log = GameLogWriter(config.game_log_path)
+
+    def collect(chunk: int, chunk_result: SimulationResult) -> None:
+        result.merge(chunk_result)
+        if chunk_result.profile is not None:
+            # the trace keeps one row per phase per chunk
+            result.trace.extend(
+                {"chunk": chunk, **row} for row in chunk_result.profile.rows()
+            )
+        if pattern_cache is not None:
+            pattern_cache.update(chunk_result.pattern_entries)
+        if game_log is not None:
+            game_log.write(chunk_result.game_log)
+
+    start_time = time.perf_counter()
+    try:
+        if workers == 1:
+            init_worker(config.pattern_cache_path, config.opening_book_path)
+            for chunk, (chunk_seed, games) in enumerate(chunks):
+                collect(chunk, play_chunk(chunk_seed, games, config))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_worker,
+                initargs=(config.pattern_cache_path, config.opening_book_path),
+            ) as executor:
+                futures = [
+                    executor.submit(play_chunk, chunk_seed, games, config)
+                    for chunk_seed, games in chunks
+                ]
+                for chunk, future in enumerate(futures):
+                    collect(chunk, future.result())
+    finally:
+        if game_log is not None:
+            game_log.close()
+    result.elapsed = time.perf_counter() - start_time
+
+    if pattern_cache is not None:
+        pattern_cache.save(config.pattern_cache_path)
+    return result
+
+
+def print_result(result: SimulationResult) -> None:
+    print(f"Total Game {result.games} WON {result.won} WIN RATE {result.win_rate}")
+    print(f"GAMES/SEC {result.games_per_second:.1f}")
+    print(
+        f"SIMPLE DEDUCTIONS/GAME {result.simple_deductions / max(result.games, 1):.1f}"
+    )
+    lookups = result.cache_hits + result.cache_misses
+    if lookups:
+        print(
+            f"PATTERN CACHE HITS {result.cache_hits} MISSES {result.cache_misses} "
+            f"HIT RATE {result.cache_hits / lookups:.3f}"
+        )
+    print("LOST STATS:")
+    print(f"simple:{result.lost[MoveType.simple]}")
+    print(f"advanced:{result.lost[MoveType.advanced]}")
+    print(f"random:{result.lost[MoveType.random]}")
+    print(f"book:{result.lost[MoveType.book]}")
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Simulate PlayerAlgo games")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="defaults to the CPU count"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--preset", choices=PRESETS, default="beginner")
+    parser.add_argument("--mines", type=int, help="overrides the preset")
+    parser.add_argument("--rows", type=int, help="overrides the preset")
+    parser.add_argument("--cols", type=int, help="overrides the preset")
+    parser.add_argument(
+        "--safe-first-click",
+        action="store_true",
+        help="place mines only after the opening move",
+    )
+    parser.add_argument(
+        "--losses", help="write the board id of every lost game to this file"
+    )
+    parser.add_argument(
+        "--solver-mode",
+        choices=[mode.name for mode in SolverMode],
+        default=SolverMode.global_csp.name,
+    )
+    parser.add_argument(
+        "--pattern-cache", help="load and save solved frontier patterns from this file"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="generate boards this many at a time with NumPy",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        help="seconds per advanced move before falling back to sampling",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="print per-phase timings"
+    )
+    parser.add_argument(
+        "--trace", help="write per-chunk phase timings to this .json or .csv file"
+    )
+    parser.add_argument(
+        "--game-log", help="append every game and its moves to this binary log"
+    )
+    parser.add_argument(
+        "--opening-book", help="play early guesses from a build_book.py book"
+    )
+    args = parser.parse_args(argv)
+    try:
+        number_of_mines, rows, cols = resolve_preset(
+            args.preset, args.mines, args.rows, args.cols
+        )
+    except ValueError as error:
+        parser.error(str(error))
+    if args.batch_size and args.safe_first_click:
+        parser.error("--batch-size boards are generated up front, not after a click")
+    if args.opening_book and args.safe_first_click:
+        parser.error("opening books are built for mines placed before the first click")
+
+    config = SimulationConfig(
+        number_of_mines=number_of_mines,
+        rows=rows,
+        cols=cols,
+        safe_first_click=args.safe_first_click,
+        record_losses=args.losses is not None,
+        solver_mode=SolverMode[args.solver_mode],
+        pattern_cache_path=args.pattern_cache,
+        batch_size=args.batch_size,
+        time_budget=args.time_budget,
+        profile=args.profile or args.trace is not None,
+        game_log_path=args.game_log,
+        opening_book_path=args.opening_book,
+    )
+    result = run_simulation(
+        total_games=args.games,
+        workers=args.workers,
+        seed=args.seed,
+        chunk_size=args.chunk_size,
+        config=config,
+    )
+    print_result(result)
+    if args.profile:
+        print("PROFILE:")
+        print(result.profile.summary())
+    if args.trace:
+        write_trace(args.trace, result.trace)
+    if args.losses:
+        with open(args.losses, "w") as losses_file:
+            losses_file.writelines(
+                f"{board_id}\n" for board_id in result.lost_board_ids
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+from collections import defaultdict, deque
+from collections.abc import Iterable, Sequence
+from math import exp, lgamma, log, sqrt
+from random import Random
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+# a constraint is (indices of the variables it covers, number of mines among them)
+Constraint = Tuple[Tuple[int, ...], int]
+
+
+class ConfigurationCounts:
+    """Per total mine count: how many assignments are valid and, for each
+    variable, in how many of those it holds a mine"""
+
+    variable_count: int
+    solutions: Dict[int, int]
+    mine_counts: Dict[int, List[int]]
+
+    def __init__(self, variable_count: int):
+        self.variable_count = variable_count
+        self.solutions = defaultdict(int)
+        self.mine_counts = {}
+
+    def total(self) -> int:
+        return sum(self.solutions.values())
+
+    def probabilities(self) -> List[float]:
+        total = self.total()
+        probabilities = [0.0] * self.variable_count
+        if not total:
+            return probabilities
+        for counts in self.mine_counts.values():
+            for variable, count in enumerate(counts):
+                probabilities[variable] += count
+        return [count / total for count in probabilities]
+
+
+def order_variables(
+    variable_count: int, variable_constraints: Sequence[Sequence[int]], constraints
+) -> List[int]:
+    # breadth-first over shared constraints so that constraints fill up (and
+    # prune) as early as possible
+    order = []
+    seen = [False] * variable_count
+    for start in range(variable_count):
+        if seen[start]:
+            continue
+        seen[start] = True
+        queue = deque([start])
+        while queue:
+            variable = queue.popleft()
+            order.append(variable)
+            for constraint in variable_constraints[variable]:
+                for other in constraints[constraint][0]:
+                    if not seen[other]:
+                        seen[other] = True
+                        queue.append(other)
+    return order
+
+
+# steps (or python-constraint checks) between deadline checks in the exact
+# solvers; a step is cheap, so this keeps overruns well under a millisecond
+DEADLINE_CHECK_STEPS = 0xFF
+# below this many draws sample_configurations reports the worst-case
+# half-width for its sample size, since the normal approximation behind the
+# usual one does not hold yet
+MIN_SAMPLES = 64
+
+
+class SolverTimeout(Exception):
+    pass
+
+
+def _index_constraints(
+    variable_count: int, constraints: Sequence[Constraint]
+) -> Tuple[List[List[int]], List[int], List[int]]:
+    variable_constraints: List[List[int]] = [[] for _ in range(variable_count)]
+    for index, (variables, _) in enumerate(constraints):
+        for variable in variables:
+            variable_constraints[variable].append(index)
+    targets = [target for _, target in constraints]
+    order = order_variables(variable_count, variable_constraints, constraints)
+    return variable_constraints, targets, order
+
+
+def count_configurations(
+    variable_count: int,
+    constraints: Sequence[Constraint],
+    max_mines: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> ConfigurationCounts:
+    result = ConfigurationCounts(variable_count)
+    if max_mines is None:
+        max_mines = variable_count
+
+    variable_constraints, targets, order = _index_constraints(
+        variable_count, constraints
+    )
+    sums = [0] * len(constraints)
+    unassigned = [len(variables) for variables, _ in constraints]
+
+    values = [0] * variable_count
+    tried = [-1] * variable_count
+    mines = 0
+    depth = 0
+    steps = 0
+    while depth >= 0:
+        steps += 1
+        if (
+            deadline is not None
+            and not steps & DEADLINE_CHECK_STEPS
+            and perf_counter() > deadline
+        ):
+            raise SolverTimeout()
+
+        if depth == variable_count:
+            result.solutions[mines] += 1
+            counts = result.mine_counts.get(mines)
+            if counts is None:
+                counts = result.mine_counts[mines] = [0] * variable_count
+            for variable in range(variable_count):
+                if values[variable]:
+                    counts[variable] += 1
+            depth -= 1
+            continue
+
+        variable = order[depth]
+        value = tried[depth]
+        if value >= 0:
+            # undo the previous choice at this depth before trying the next one
+            for constraint in variable_constraints[variable]:
+                sums[constraint] -= value
+                unassigned[constraint] += 1
+            mines -= value
+
+        value += 1
+        while value <= 1:
+            if mines + value <= max_mines and all(
+                targets[c] - unassigned[c] + 1 <= sums[c] + value <= targets[c]
+                for c in variable_constraints[variable]
+            ):
+                break
+            value += 1
+        if value > 1:
+            tried[depth] = -1
+            depth -= 1
+            continue
+
+        for constraint in variable_constraints[variable]:
+            sums[constraint] += value
+            unassigned[constraint] -= 1
+        mines += value
+        values[variable] = value
+        tried[depth] = value
+        depth += 1
+
+    return result
+
+
+class SampledProbabilities:
+    """Importance-sampled mine probabilities with ~95% confidence half-widths"""
+
+    probabilities: List[float]
+    half_widths: List[float]
+    interior_probability: float
+    interior_half_width: float
+    samples: int
+
+    def __init__(
+        self,
+        probabilities: List[float],
+        half_widths: List[float],
+        interior_probability: float,
+        interior_half_width: float,
+        samples: int,
+    ):
+        self.probabilities = probabilities
+        self.half_widths = half_widths
+        self.interior_probability = interior_probability
+        self.interior_half_width = interior_half_width
+        self.samples = samples
+
+
+def sample_configurations(
+    variable_count: int,
+    constraints: Sequence[Constraint],
+    deadline: float,
+    max_mines: Optional[int] = None,
+    interior_count: int = 0,
+    remaining_mines: Optional[int] = None,
+    max_samples: int = 100000,
+    rng: Optional[Random] = None,
+    min_samples: int = MIN_SAMPLES,
+) -> Optional[SampledProbabilities]:
+    # Sequential importance sampling: walk the variables in constraint order,
+    # pick uniformly among the values forward checking still allows and weight
+    # the finished assignment by the product of the number of choices (times
+    # C(interior, remaining - mines) when the interior is accounted for).
+    rng = rng or Random()
+    if max_mines is None:
+        max_mines = variable_count if remaining_mines is None else remaining_mines
+    variable_constraints, targets, order = _index_constraints(
+        variable_count, constraints
+    )
+    scopes = [len(variables) for variables, _ in constraints]
+
+    peak = None
+    weight_sum = squared_sum = 0.0
+    interior_sum = interior_squared = interior_squared_square = 0.0
+    mine_sums = [0.0] * variable_count
+    squared_mine_sums = [0.0] * variable_count
+    samples = 0
+    # one draw even past the deadline, so there is always an estimate
+    while samples < max_samples and (not samples or perf_counter() < deadline):
+        samples += 1
+        sums = [0] * len(constraints)
+        unassigned = list(scopes)
+        assigned = []
+        mines = 0
+        log_weight = 0.0
+        for variable in order:
+            choices = [
+                value
+                for value in (0, 1)
+                if mines + value <= max_mines
+                and all(
+                    targets[c] - unassigned[c] + 1 <= sums[c] + value <= targets[c]
+                    for c in variable_constraints[variable]
+                )
+            ]
+            if not choices:
+                break
+            value = choices[0] if len(choices) == 1 else rng.randint(0, 1)
+            log_weight += log(len(choices))
+            for constraint in variable_constraints[variable]:
+                sums[constraint] += value
+                unassigned[constraint] -= 1
+            mines += value
+            if value:
+                assigned.append(variable)
+        else:
+            if remaining_mines is not None:
+                outside = remaining_mines - mines
+                if not 0 <= outside <= interior_count:
+                    continue
+                log_weight += _log_comb(interior_count, outside)
+
+            if peak is None or log_weight > peak:
+                # rescale the running sums so the largest weight stays at 1
+                scale = exp(peak - log_weight) if peak is not None else 0.0
+                weight_sum *= scale
+                interior_sum *= scale
+                squared_sum *= scale * scale
+                interior_squared *= scale * scale
+                interior_squared_square *= scale * scale
+                mine_sums = [s * scale for s in mine_sums]
+                squared_mine_sums = [s * scale * scale for s in squared_mine_sums]
+                peak = log_weight
+            weight = exp(log_weight - peak)
+            weight_sum += weight
+            squared_sum += weight * weight
+            if interior_count and remaining_mines is not None:
+                density = (remaining_mines - mines) / interior_count
+                interior_sum += weight * density
+                interior_squared += weight * weight * density
+                interior_squared_square += weight * weight * density * density
+            for variable in assigned:
+                mine_sums[variable] += weight
+                squared_mine_sums[variable] += weight * weight
+
+    if not weight_sum:
+        return None
+
+    # cut short by the deadline, the estimates are only bounded by the
+    # variance of a 0/1 value (at most 1/4) over the effective sample size
+    floor = (
+        1.96 * sqrt(0.25 * squared_sum) / weight_sum if samples < min_samples else 0.0
+    )
+    probabilities = [s / weight_sum for s in mine_sums]
+    half_widths = []
+    for probability, squared in zip(probabilities, squared_mine_sums):
+        # mine indicators are 0/1, so the sum of w^2 x^2 is the sum of w^2 x
+        variance = (
+            squared * (1 - 2 * probability) + probability**2 * squared_sum
+        ) / weight_sum**2
+        half_widths.append(max(1.96 * sqrt(max(variance, 0.0)), floor))
+    interior_probability = interior_sum / weight_sum
+    interior_variance = (
+        interior_squared_square
+        - 2 * interior_probability * interior_squared
+        + interior_probability**2 * squared_sum
+    ) / weight_sum**2
+    return SampledProbabilities(
+        probabilities=probabilities,
+        half_widths=half_widths,
+        interior_probability=interior_probability,
+        interior_half_width=max(1.96 * sqrt(max(interior_variance, 0.0)), floor),
+        samples=samples,
+    )
+
+
+def split_components(
+    variable_count: int, constraints: Sequence[Constraint]
+) -> List[Tuple[List[int], List[Constraint]]]:
+    parents = list(range(variable_count))
+
+    def find(variable: int) -> int:
+        while parents[variable] != variable:
+            parents[variable] = parents[parents[variable]]
+            variable = parents[variable]
+        return variable
+
+    for variables, _ in constraints:
+        root = find(variables[0])
+        for variable in variables[1:]:
+            other = find(variable)
+            if other != root:
+                parents[other] = root
+
+    members: Dict[int, List[int]] = defaultdict(list)
+    for variable in range(variable_count):
+        members[find(variable)].append(variable)
+
+    components = []
+    for root, variables in members.items():
+        local = {variable: i for i, variable in enumerate(variables)}
+        local_constraints = [
+            (tuple(local[v] for v in scope), target)
+            for scope, target in constraints
+            if find(scope[0]) == root
+        ]
+        components.append((variables, local_constraints))
+    return components
+
+
+def _log_comb(n: int, k: int) -> float:
+    return lgamma(n + 1) - lgamma(k + 1) - lgamma(n - k + 1)
+
+
+def _convolve(left: Dict[int, float], right: Dict[int, float]) -> Dict[int, float]:
+    result: Dict[int, float] = defaultdict(float)
+    for left_mines, left_weight in left.items():
+        for right_mines, right_weight in right.items():
+            result[left_mines + right_mines] += left_weight * right_weight
+    return result
+
+
+def combine_components(
+    components: Sequence[ConfigurationCounts],
+    interior_count: int,
+    remaining_mines: int,
+) -> Optional[Tuple[List[List[float]], float]]:
+    # each component's counts are scaled by its own largest tally, which
+    # cancels out in the ratios but keeps the products within float range
+    distributions = []
+    for counts in components:
+        scale = max(counts.solutions.values(), default=0)
+        if not scale:
+            return None
+        distributions.append(
+            {mines: total / scale for mines, total in counts.solutions.items()}
+        )
+
+    def interior_weights(frontier_mines: Iterable[int]) -> Dict[int, float]:
+        # C(interior, remaining - frontier mines) for each feasible frontier total
+        feasible = [
+            mines
+            for mines in frontier_mines
+            if 0 <= remaining_mines - mines <= interior_count
+        ]
+        if not feasible:
+            return {}
+        logs = {m: _log_comb(interior_count, remaining_mines - m) for m in feasible}
+        peak = max(logs.values())
+        return {mines: exp(log - peak) for mines, log in logs.items()}
+
+    prefixes = [{0: 1.0}]
+    for distribution in distributions:
+        prefixes.append(_convolve(prefixes[-1], distribution))
+    suffixes = [{0: 1.0}]
+    for distribution in reversed(distributions):
+        suffixes.append(_convolve(suffixes[-1], distribution))
+    suffixes.reverse()
+
+    totals = prefixes[-1]
+    weights = interior_weights(totals)
+    total_weight = sum(totals[m] * w for m, w in weights.items() if m in totals)
+    if not total_weight:
+        return None
+
+    probabilities = []
+    for index, counts in enumerate(components):
+        others = _convolve(prefixes[index], suffixes[index + 1])
+        scale = max(counts.solutions.values())
+        cell_weights = [0.0] * counts.variable_count
+        for mines, mine_counts in counts.mine_counts.items():
+            outside = sum(
+                other_weight * weights.get(mines + other_mines, 0.0)
+                for other_mines, other_weight in others.items()
+            )
+            if not outside:
+                continue
+            for variable, count in enumerate(mine_counts):
+                cell_weights[variable] += count / scale * outside
+        probabilities.append([weight / total_weight for weight in cell_weights])
+
+    interior_probability = 0.0
+    if interior_count:
+        interior_probability = (
+            sum(
+                totals[m] * w * (remaining_mines - m)
+                for m, w in weights.items()
+                if m in totals
+            )
+            / interior_count
+            / total_weight
+        )
+    return probabilities, interior_probability
+
+
+def solve_components(
+    variable_count: int,
+    constraints: Sequence[Constraint],
+    interior_count: int,
+    remaining_mines: int,
+    deadline: Optional[float] = None,
+) -> Optional[Tuple[List[float], float]]:
+    components = split_components(variable_count, constraints)
+    counts = [
+        count_configurations(
+            len(variables), local, max_mines=remaining_mines, deadline=deadline
+        )
+        for variables, local in components
+    ]
+    combined = combine_components(counts, interior_count, remaining_mines)
+    if combined is None:
+        return None
+
+    component_probabilities, interior_probability = combined
+    probabilities = [0.0] * variable_count
+    for (variables, _), local in zip(components, component_probabilities):
+        for variable, probability in zip(variables, local):
+            probabilities[variable] = probability
+    return probabilities, interior_probability
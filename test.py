@@ -1,25 +1,260 @@
-from collections import defaultdict
+import os
+import random
+import sys
+import tempfile
+from collections.abc import Iterator
+from itertools import combinations, product
+from typing import Dict, List, Tuple
 
+from board import Board
+from build_book import build_book
 from game import Game, GameState
-from player_algo import MoveType, PlayerAlgo
-
-player_algo = PlayerAlgo()
-won = 0
-lost = defaultdict(int)
-total_games = 10000
-for i in range(1, total_games + 1):
-    game = Game()
-    while game.state == GameState.UNSTARTED or game.state == GameState.IN_PROGRESS:
-        player_algo.make_a_move(game=game)
-    if game.state == GameState.WON:
-        won += 1
-        print(f"Game {i} WON")
+from game_log import GameLog, GameLogWriter, encode_game
+from helper import (
+    get_perimeter_groups,
+    run_component_CSP_on,
+    run_CSP_on,
+    run_EPP_on,
+    run_global_CSP_on,
+)
+from opening_book import PROBABILITY_SCALE, OpeningBook, position_key, write_book
+from player_algo import PlayerAlgo, SolverMode
+from replay import replay
+from simulation import main
+
+# positions with at most this many unknown cells are checked by brute force
+MAX_BRUTE_FORCE_UNKNOWN = 16
+TOLERANCE = 1e-9
+
+Constraints = List[Tuple[List[int], int]]
+
+
+def _constraints(board: Board) -> Constraints:
+    # (unknown neighbours, mines still to place among them) per opened number
+    constraints = []
+    for index in range(board.size):
+        if board.opened[index] and board.has_unknown_neighbour(index):
+            unknown = board.get_unknown_neighbours(index)
+            constraints.append(
+                (unknown, board.counts[index] - board.count_flagged_neighbours(index))
+            )
+    return constraints
+
+
+def _satisfied(constraints: Constraints, mines: set) -> bool:
+    return all(
+        sum(index in mines for index in unknown) == total
+        for unknown, total in constraints
+    )
+
+
+def _brute_force_board(board: Board, remaining_mines: int) -> Dict[int, float]:
+    # every layout of the remaining mines over the unknown cells, equally likely
+    unknown = [index for index in range(board.size) if board.is_unknown(index)]
+    constraints = _constraints(board)
+    hits = dict.fromkeys(unknown, 0)
+    layouts = 0
+    for placed in combinations(unknown, remaining_mines):
+        mines = set(placed)
+        if _satisfied(constraints, mines):
+            layouts += 1
+            for index in placed:
+                hits[index] += 1
+    return {index: count / layouts for index, count in hits.items()} if layouts else {}
+
+
+def _brute_force_frontier(
+    board: Board, cells: List[int], max_mines: int
+) -> Dict[int, float]:
+    # every assignment of the given cells that satisfies the numbers next to
+    # them, each counted once whatever the rest of the board holds
+    constraints = [
+        (unknown, total)
+        for unknown, total in _constraints(board)
+        if set(unknown) <= set(cells)
+    ]
+    hits = dict.fromkeys(cells, 0)
+    assignments = 0
+    for values in product((0, 1), repeat=len(cells)):
+        if sum(values) > max_mines:
+            continue
+        mines = {index for index, value in zip(cells, values) if value}
+        if _satisfied(constraints, mines):
+            assignments += 1
+            for index in mines:
+                hits[index] += 1
+    if not assignments:
+        return {}
+    return {index: count / assignments for index, count in hits.items()}
+
+
+def _assert_close(
+    game: Game, solved: Dict, expected: Dict[int, float], solver: str
+) -> None:
+    board = game.board
+    got = {board.index(slot.row, slot.col): p for slot, p in solved.items()}
+    assert got.keys() <= expected.keys(), solver
+    for index, probability in got.items():
+        assert abs(probability - expected[index]) < TOLERANCE, (
+            solver,
+            board.position(index),
+            probability,
+            expected[index],
+        )
+
+
+def _small_positions(count: int) -> Iterator[Game]:
+    # mid-game positions on small boards, reached by playing the bot
+    rng = random.Random(17)
+    player = PlayerAlgo(solver_mode=SolverMode.components, rng=random.Random(17))
+    found = 0
+    while found < count:
+        game = Game(number_of_mines=5, rows=4, cols=5, seed=rng.getrandbits(64))
+        while game.state in [GameState.UNSTARTED, GameState.IN_PROGRESS]:
+            board = game.board
+            unknown = sum(board.is_unknown(i) for i in range(board.size))
+            if (
+                game.state == GameState.IN_PROGRESS
+                and board.frontier
+                and unknown <= MAX_BRUTE_FORCE_UNKNOWN
+            ):
+                found += 1
+                yield game
+                break
+            player.play_step(game)
+
+
+def check_solvers_against_brute_force() -> None:
+    for game in _small_positions(40):
+        board = game.board
+        grid = game.grid
+        remaining_mines = game.number_of_mines - game.get_flag_total()
+        constrained = game.get_constrained_unopened_slots()
+        unconstrained = game.get_unconstrained_unopened_slots()
+        constraint_slots = game.get_constraint_slots()
+
+        whole_board = _brute_force_board(board, remaining_mines)
+        _assert_close(
+            game,
+            run_component_CSP_on(
+                grid=grid,
+                constrained_slots=constrained,
+                unconstrained_slots=unconstrained,
+                remaining_mines=remaining_mines,
+                constraint_slots=constraint_slots,
+            ),
+            whole_board,
+            "component",
+        )
+
+        frontier = [board.index(slot.row, slot.col) for slot in constrained]
+        _assert_close(
+            game,
+            run_global_CSP_on(
+                grid=grid,
+                constrained_slots=constrained,
+                remaining_mines=remaining_mines,
+                constraint_slots=constraint_slots,
+            ),
+            _brute_force_frontier(board, frontier, remaining_mines),
+            "global",
+        )
+
+        for group in get_perimeter_groups(grid, constrained):
+            cells = [board.index(slot.row, slot.col) for slot in group]
+            expected = _brute_force_frontier(board, cells, len(cells))
+            for name, solve in (("csp", run_CSP_on), ("epp", run_EPP_on)):
+                _assert_close(game, solve(grid, group), expected, name)
+
+
+def _play(game: Game, player: PlayerAlgo) -> list:
+    moves = []
+    while game.state in [GameState.UNSTARTED, GameState.IN_PROGRESS]:
+        moves.extend(player.make_a_move(game))
+    return moves
+
+
+def check_game_log_round_trip() -> None:
+    player = PlayerAlgo(solver_mode=SolverMode.components, rng=random.Random(3))
+    games = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "games.log")
+        with GameLogWriter(path) as writer:
+            for seed, (mines, rows, cols) in enumerate(
+                [(10, 9, 9), (40, 16, 16), (99, 16, 30)] * 3
+            ):
+                game = Game(number_of_mines=mines, rows=rows, cols=cols, seed=seed)
+                moves = _play(game, player)
+                writer.write(encode_game(game, moves))
+                games.append((game, sum(len(move.actions) for move in moves)))
+
+        with GameLog(path) as log:
+            assert len(log) == len(games)
+            for (game, action_count), record in zip(games, log):
+                assert (record.rows, record.cols, record.number_of_mines) == (
+                    game.rows,
+                    game.cols,
+                    game.number_of_mines,
+                )
+                assert record.state == game.state
+                assert len(record.moves) == action_count
+                assert bytes(record.board().mines) == bytes(game.board.mines)
+                replayed = record.new_game()
+                for _, replayed in replay(record):
+                    pass
+                assert replayed.state == record.state
+                assert replayed.observation() == game.observation()
+
+
+def check_opening_book() -> None:
+    positions = build_book(games=400, workers=1, seed=5)
+    booked = {key: stats for key, stats in positions.items() if stats is not None}
+    assert booked
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "book.bin")
+        written = write_book(
+            path,
+            9,
+            9,
+            10,
+            8,
+            ((key, stats.best(), stats.probability) for key, stats in booked.items()),
+        )
+        assert written == len(booked)
+        with OpeningBook(path) as book:
+            assert len(book) == written
+            assert book.covers(9, 9, 10, 0) and not book.covers(9, 9, 11, 0)
+            for key, stats in booked.items():
+                index, probability = book.lookup_key(key)
+                assert index == stats.best()
+                assert abs(probability - stats.probability) <= 1 / PROBABILITY_SCALE
+            # a live board finds the entry its position was booked under
+            game = Game(number_of_mines=10, rows=9, cols=9, seed=1)
+            key = position_key(game.board)
+            entry = book.lookup(game.board)
+            if key in booked:
+                assert entry is not None and entry[0] == booked[key].best()
+            else:
+                assert entry is None
+
+
+CHECKS = (
+    check_solvers_against_brute_force,
+    check_game_log_round_trip,
+    check_opening_book,
+)
+
+
+def run_checks() -> None:
+    for check in CHECKS:
+        check()
+        print(f"{check.__name__}: ok")
+
+
+if __name__ == "__main__":
+    # "python test.py --check" runs the regression checks; anything else is
+    # passed to the simulation runner
+    if sys.argv[1:] == ["--check"]:
+        run_checks()
     else:
-        lost[player_algo.last_move_played] += 1
-        print(f"Game {i} LOST")
-
-print(f"Total Game {total_games} WON {won} WIN RATE {won / float(total_games)}")
-print("LOST STATS:")
-print(f"simple:{lost[MoveType.simple]}")
-print(f"advanced:{lost[MoveType.advanced]}")
-print(f"random:{lost[MoveType.random]}")
+        main()
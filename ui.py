@@ -1,11 +1,41 @@
-from typing import Sequence
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
-from pygame import BLEND_RGBA_MULT, SRCALPHA, Rect, Surface, font, image, transform
+import numpy as np
+from pygame import (
+    BLEND_RGBA_MULT,
+    SRCALPHA,
+    Rect,
+    Surface,
+    font,
+    image,
+    surfarray,
+    transform,
+)
 
-from game import Game, Slot
+from board import Board
+from game import Game, GameState
 
 WIDTH, HEIGHT = 600, 600
 OFFSET_X, OFFSET_Y = 50, 50
+# past this many changed cells one blit of the whole board is cheaper
+MAX_CELL_RECTS = 64
+# below this many pixels per slot the board is drawn one pixel per cell and
+# scaled up, without images or overlays
+MIN_IMAGE_SLOT_SIZE = 8
+
+# cell states as drawn: closed, flagged, opened mine, then opened 0-8
+CLOSED, FLAGGED, MINE, OPENED = 0, 1, 2, 3
+NO_OVERLAY = 0xFF
+STATUS_TOP = 100
+# colour per cell state on boards drawn one pixel per cell
+PIXEL_PALETTE = np.array(
+    [(128, 128, 128), (230, 120, 0), (0, 0, 0)]
+    + [(220, 220, 220)]
+    + [(255 - 20 * count, 255 - 20 * count, 255) for count in range(1, 9)],
+    dtype=np.uint8,
+)
 
 open_slot_images = None
 closed_slot_image = None
@@ -22,8 +52,7 @@ def _tint_image(image, tint_color):
     return tinted_image
 
 
-def load_images(column_size: int):
-    slot_size = WIDTH // column_size
+def load_images(slot_size: int):
     global open_slot_images, closed_slot_image, mine_image, flag_image
     open_slot_images = []
     temp = image.load("assets/default.png").convert_alpha()
@@ -43,44 +72,218 @@ def load_images(column_size: int):
     flag_image = transform.scale(temp, (slot_size, slot_size))
 
 
-def get_slot_image(slot: Slot) -> Surface:
-    if slot.is_flagged:
+def get_state_image(state: int) -> Surface:
+    if state == FLAGGED:
         return flag_image
-    if not slot.is_opened:
+    if state == CLOSED:
         return closed_slot_image
-    if slot.has_mine:
+    if state == MINE:
         return mine_image
-    return open_slot_images[slot.number_of_mines_around]
+    return open_slot_images[state - OPENED]
 
 
-CollisionRects = Sequence[Sequence[Rect]]
+def get_cell_states(board: Board) -> np.ndarray:
+    opened = np.frombuffer(board.opened, dtype=np.uint8).astype(bool)
+    mines = np.frombuffer(board.mines, dtype=np.uint8).astype(bool)
+    counts = np.frombuffer(board.counts, dtype=np.uint8)
+    states = np.where(opened, OPENED + counts, CLOSED).astype(np.uint8)
+    states[opened & mines] = MINE
+    states[np.frombuffer(board.flagged, dtype=np.uint8).astype(bool)] = FLAGGED
+    return states
 
 
-def draw_board(screen: Surface, game: Game) -> CollisionRects:
-    screen.fill("white")
-    grid = []
-    slot_size = WIDTH // game.cols
-    for col in range(game.cols):
-        rows = []
-        for row in range(game.rows):
-            x = col * slot_size + OFFSET_X
-            y = row * slot_size + OFFSET_Y
-            rows.append(screen.blit(get_slot_image(game.grid[col][row]), (x, y)))
-        grid.append(rows)
-    return grid
+@lru_cache(maxsize=None)
+def get_probability_overlay(percent: int, slot_size: int) -> Surface:
+    # green for safe through red for a certain mine, with the percentage on
+    # slots big enough to read it
+    overlay = Surface((slot_size, slot_size), SRCALPHA)
+    overlay.fill((255 * percent // 100, 255 * (100 - percent) // 100, 0, 110))
+    if slot_size >= 20:
+        text = render_text(str(percent), "black", slot_size // 2)
+        overlay.blit(text, text.get_rect(center=overlay.get_rect().center))
+    return overlay
 
 
-def win_screen(screen: Surface):
-    text_surface = font.Font(None, 36).render("CONGRATS! YOU WIN", True, "green")
-    text_rect = text_surface.get_rect()
-    right_padding = 20
-    text_rect.topright = (screen.get_width() - right_padding, 50)
-    screen.blit(text_surface, text_rect)
+def get_overlay_percents(board: Board, probabilities: Mapping) -> np.ndarray:
+    # mine probability per cell in whole percent, NO_OVERLAY where there is none
+    percents = np.full(board.size, NO_OVERLAY, dtype=np.uint8)
+    for (row, col), probability in probabilities.items():
+        percents[board.index(row, col)] = round(probability * 100)
+    return percents
+
+
+@lru_cache(maxsize=None)
+def get_font(size: int) -> font.Font:
+    return font.Font(None, size)
+
+
+@lru_cache(maxsize=256)
+def render_text(text: str, color: str, size: int = 36) -> Surface:
+    return get_font(size).render(text, True, color)
+
+
+class BoardRenderer:
+    """Draws a game onto the screen, redrawing only the cells whose state or
+    probability overlay changed since the last frame. draw returns the
+    screen rects it touched, for pygame.display.update."""
+
+    screen: Surface
+    slot_size: int
+
+    def __init__(self, screen: Surface):
+        self.screen = screen
+        self.slot_size = 0
+        self._game: Optional[Game] = None
+        self._surface: Optional[Surface] = None
+        self._scaled_size: Tuple[int, int] = (0, 0)
+        self._states: Optional[np.ndarray] = None
+        self._overlay: Optional[np.ndarray] = None
+        self._game_state: Optional[GameState] = None
+        self._status: Sequence[str] = ()
+        self._status_rect: Optional[Rect] = None
+
+    def _reset(self, game: Game) -> None:
+        # a new game, or a new board size, redraws everything
+        if self._game is None or (self._game.rows, self._game.cols) != (
+            game.rows,
+            game.cols,
+        ):
+            self.slot_size = min(WIDTH // game.cols, HEIGHT // game.rows)
+            if self.slot_size >= MIN_IMAGE_SLOT_SIZE:
+                load_images(self.slot_size)
+                self._surface = Surface(
+                    (game.cols * self.slot_size, game.rows * self.slot_size)
+                )
+            else:
+                # one pixel per cell, scaled to fit when drawn
+                self._surface = Surface((game.cols, game.rows))
+                scale = min(WIDTH / game.cols, HEIGHT / game.rows)
+                self._scaled_size = (
+                    max(round(game.cols * scale), 1),
+                    max(round(game.rows * scale), 1),
+                )
+        self._game = game
+        self._states = np.full(game.board.size, 0xFF, dtype=np.uint8)
+        self._overlay = np.full(game.board.size, NO_OVERLAY, dtype=np.uint8)
+        self._game_state = None
+        self._status = ()
+
+    @property
+    def pixel_cells(self) -> bool:
+        return self.slot_size < MIN_IMAGE_SLOT_SIZE
 
+    def board_rect(self) -> Rect:
+        if self.pixel_cells:
+            return Rect((OFFSET_X, OFFSET_Y), self._scaled_size)
+        return self._surface.get_rect(topleft=(OFFSET_X, OFFSET_Y))
 
-def lose_screen(screen: Surface):
-    text_surface = font.Font(None, 36).render("GAME OVER! YOU LOSE", True, "red")
+    def cell_at(self, position: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        # (row, col) of the cell under a screen position
+        rect = self.board_rect() if self._game is not None else None
+        if rect is None or not rect.collidepoint(position):
+            return None
+        col = (position[0] - rect.left) * self._game.cols // rect.width
+        row = (position[1] - rect.top) * self._game.rows // rect.height
+        return row, col
+
+    def _draw_pixels(self, game: Game, states: np.ndarray) -> List[Rect]:
+        # the whole board as one pixel per cell; surfarray is indexed
+        # [x][y], which matches the column-major board
+        colours = PIXEL_PALETTE[states].reshape(game.cols, game.rows, 3)
+        surfarray.blit_array(self._surface, colours)
+        self._states = states
+        scaled = transform.scale(self._surface, self._scaled_size)
+        return [self.screen.blit(scaled, self.board_rect())]
+
+    def draw(self, game: Game, probabilities: Optional[Mapping] = None) -> List[Rect]:
+        # probabilities map (row, col) to a mine probability shown over
+        # closed slots
+        full_redraw = game is not self._game
+        if full_redraw:
+            self._reset(game)
+
+        states = get_cell_states(game.board)
+        if self.pixel_cells:
+            if full_redraw:
+                self.screen.fill("white")
+            dirty = []
+            if full_redraw or not np.array_equal(states, self._states):
+                dirty = self._draw_pixels(game, states)
+            if full_redraw:
+                dirty = [self.screen.get_rect()]
+            return dirty + self._draw_game_state(game)
+
+        overlay = get_overlay_percents(game.board, probabilities or {})
+        overlay[states != CLOSED] = NO_OVERLAY
+        changed = np.flatnonzero((states != self._states) | (overlay != self._overlay))
+        self._states = states
+        self._overlay = overlay
+        rects = []
+        size = self.slot_size
+        rows = game.rows
+        for index in changed.tolist():
+            col, row = divmod(index, rows)
+            position = (col * size, row * size)
+            rect = self._surface.blit(get_state_image(int(states[index])), position)
+            if overlay[index] != NO_OVERLAY:
+                self._surface.blit(
+                    get_probability_overlay(int(overlay[index]), size), position
+                )
+            rects.append(rect)
+
+        if full_redraw:
+            self.screen.fill("white")
+            self.screen.blit(self._surface, self.board_rect())
+            dirty = [self.screen.get_rect()]
+        elif len(rects) > MAX_CELL_RECTS:
+            dirty = [self.screen.blit(self._surface, self.board_rect())]
+        else:
+            dirty = [
+                self.screen.blit(self._surface, rect.move(OFFSET_X, OFFSET_Y), rect)
+                for rect in rects
+            ]
+        return dirty + self._draw_game_state(game)
+
+    def _draw_game_state(self, game: Game) -> List[Rect]:
+        if game.state == self._game_state:
+            return []
+        self._game_state = game.state
+        if game.state == GameState.LOST:
+            return [lose_screen(self.screen)]
+        if game.state == GameState.WON:
+            return [win_screen(self.screen)]
+        return []
+
+    def draw_status(self, lines: Sequence[str]) -> List[Rect]:
+        # text lines to the right of the board, redrawn only when they change
+        if list(lines) == list(self._status):
+            return []
+        self._status = list(lines)
+        dirty = []
+        if self._status_rect is not None:
+            dirty.append(self.screen.fill("white", self._status_rect))
+        top = STATUS_TOP
+        left = self.board_rect().right + 40
+        rects = []
+        for line in lines:
+            rects.append(self.screen.blit(render_text(line, "black", 28), (left, top)))
+            top = rects[-1].bottom + 6
+        self._status_rect = rects[0].unionall(rects) if rects else None
+        if self._status_rect is not None:
+            dirty.append(self._status_rect)
+        return dirty
+
+
+def _banner(screen: Surface, text_surface: Surface) -> Rect:
     text_rect = text_surface.get_rect()
     right_padding = 20
     text_rect.topright = (screen.get_width() - right_padding, 50)
-    screen.blit(text_surface, text_rect)
+    return screen.blit(text_surface, text_rect)
+
+
+def win_screen(screen: Surface) -> Rect:
+    return _banner(screen, render_text("CONGRATS! YOU WIN", "green"))
+
+
+def lose_screen(screen: Surface) -> Rect:
+    return _banner(screen, render_text("GAME OVER! YOU LOSE", "red"))